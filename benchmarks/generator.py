@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+import random
+from datetime import datetime, timedelta
+import decimal
+
+from pypfp.core import Field, FixedEngine, RecordMetaClass, Record
+from pypfp.converters import Int, BigInt, Float, Decimal, String, DateTime
+from samples.records import Header, Address
+
+# converter, width and params of the fields used to build synthetic records
+FIELD_TYPES = {
+    'int': (Int, 8, {}),
+    'bigint': (BigInt, 15, {}),
+    'float': (Float, 14, {'precision': 4}),
+    'implied': (Float, 12, {'precision': 2, 'decimal_separator': ''}),
+    'decimal': (Decimal, 14, {'precision': 2, 'decimal_separator': ''}),
+    'string': (String, 20, {}),
+    'datetime': (DateTime, 8, {'str_format': '%Y%m%d'}),
+}
+
+DEFAULT_MIX = 'int=3,string=3,float=2,implied=1,decimal=1,datetime=1'
+
+
+def parse_mix(mix):
+    res = []
+    for item in mix.split(','):
+        name, _, weight = item.partition('=')
+        if name not in FIELD_TYPES:
+            raise ValueError('Unknown field type: %s' % name)
+        res.extend([name] * int(weight or 1))
+    return res
+
+
+def make_record(index, width=200, mix=DEFAULT_MIX):
+    # a Record class with a two char selector and fields taken in turns
+    # from the mix until the line is width chars long
+    attrs = {'typ': Field(String, 2, default=u'%02d' % index)}
+
+    class Meta:
+        selector_string = u'%02d' % index
+
+    attrs['Meta'] = Meta
+    used = 2
+    for i, name in enumerate(parse_mix(mix) * width):
+        converter, field_width, params = FIELD_TYPES[name]
+        if used + field_width > width:
+            break
+        attrs['f%d_%s' % (i, name)] = Field(converter, field_width, **params)
+        used += field_width
+    if used < width:
+        attrs['pad'] = Field(String, width - used)
+    # registered here so parsed records can be pickled by parallel loads
+    name = 'Synthetic%02d' % index
+    attrs['__module__'] = __name__
+    globals()[name] = RecordMetaClass(name, (Record,), attrs)
+    return globals()[name]
+
+
+def make_engine(types=1, width=200, mix=DEFAULT_MIX):
+    records = [make_record(i + 1, width, mix) for i in range(types)]
+    return FixedEngine(records, selector_slice=(0, 2))
+
+
+def sample_engine():
+    return FixedEngine([Header, Address], selector_slice=(0, 2))
+
+
+def random_value(converter, rnd):
+    t = type(converter)
+    if t in (Int, BigInt):
+        return rnd.randint(-10 ** (converter.width - 2),
+                           10 ** (converter.width - 1) - 1)
+    if t is Float:
+        return round(rnd.uniform(-10 ** 6, 10 ** 6), converter.precision)
+    if t is Decimal:
+        return decimal.Decimal(rnd.randint(-10 ** 8, 10 ** 8)).scaleb(
+                                                        -converter.precision)
+    if t is DateTime:
+        return datetime(2000, 1, 1) + timedelta(days=rnd.randint(0, 9000))
+    letters = u'abcdefghijklmnopqrstuvwxyz '
+    return u''.join(rnd.choice(letters)
+                    for _ in range(rnd.randint(0, converter.width)))
+
+
+def random_objects(engine, rows, seed=0):
+    rnd = random.Random(seed)
+    for _ in xrange(rows):
+        record = rnd.choice(engine.records)
+        obj = record()
+        for field in record._record_options.fields:
+            if field.name != 'typ':
+                setattr(obj, field.name, random_value(field.converter, rnd))
+        if record in (Header, Address):
+            obj.typ = int(record._record_options.selector_string)
+        yield obj
+
+
+def generate_file(path, engine, rows, seed=0):
+    engine.save(path, random_objects(engine, rows, seed))
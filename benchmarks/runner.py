@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import time
+import argparse
+import resource
+import tempfile
+import random
+import multiprocessing
+from itertools import islice
+
+from pypfp.columnar import np
+from benchmarks.generator import (make_engine, sample_engine, random_value,
+                                  FIELD_TYPES, DEFAULT_MIX, generate_file)
+
+
+def _peak_kb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _child(conn, func):
+    base = _peak_kb()
+    start = time.time()
+    rows = func()
+    conn.send((rows, time.time() - start, _peak_kb() - base))
+
+
+def measure(func):
+    # each benchmark runs in its own forked process, so the peak memory
+    # reported is the one of that benchmark only
+    parent, child = multiprocessing.Pipe(False)
+    p = multiprocessing.Process(target=_child, args=(child, func))
+    p.start()
+    child.close()
+    try:
+        res = parent.recv()
+    except EOFError:
+        res = None
+    p.join()
+    return res
+
+
+def converter_benchmarks(rows, seed=0):
+    rnd = random.Random(seed)
+    res = []
+    for name in sorted(FIELD_TYPES):
+        converter_class, width, params = FIELD_TYPES[name]
+        converter = converter_class(width, **params)
+        values = [random_value(converter, rnd) for _ in xrange(1000)]
+        strings = [converter.to_string(v) for v in values]
+        n = max(1, rows // 1000)
+
+        def to_value(converter=converter, strings=strings, n=n):
+            for _ in xrange(n):
+                for s in strings:
+                    converter.to_value(s)
+            return n * len(strings)
+
+        def to_string(converter=converter, values=values, n=n):
+            for _ in xrange(n):
+                for v in values:
+                    converter.to_string(v)
+            return n * len(values)
+
+        res.append(('%s.to_value' % name, to_value, None))
+        res.append(('%s.to_string' % name, to_string, None))
+    return res
+
+
+def record_benchmarks(engine, path, encoding='utf-8'):
+    lines = list(islice(open(path, 'rb'), 10000))
+    lines = [l.decode(encoding) for l in lines]
+    pairs = [(engine.selector(l), l) for l in lines]
+    objs = [r.to_value(l) for r, l in pairs]
+
+    def to_value():
+        for record, line in pairs:
+            record.to_value(line)
+        return len(pairs)
+
+    def to_string():
+        for obj in objs:
+            engine.find_record(obj).to_string(obj)
+        return len(objs)
+
+    size = sum(len(l) for l in lines)
+    return [('Record.to_value', to_value, size),
+            ('Record.to_string', to_string, size)]
+
+
+def engine_benchmarks(engine, path, workers=None, encoding='utf-8'):
+    size = os.path.getsize(path)
+    out = path + '.out'
+
+    def load():
+        return len(engine.load(path, encoding))
+
+    def iter_load():
+        return sum(1 for _ in engine.iter_load(path, encoding))
+
+    def save():
+        engine.save(out, engine.iter_load(path, encoding), encoding)
+        os.remove(out)
+        return sum(1 for _ in open(path, 'rb'))
+
+    def bytes_mode():
+        # generated files are ascii, so they are valid latin-1 too
+        return sum(1 for _ in engine.iter_load(path, 'latin-1',
+                                               bytes_mode=True))
+
+    def stats():
+        engine.enable_stats()
+        try:
+            return sum(1 for _ in engine.iter_load(path, encoding))
+        finally:
+            engine.stats = None
+
+    def lazy():
+        # reading only the field the selector looks at
+        engine.lazy = True
+        try:
+            return sum(1 for o in engine.iter_load(path, encoding) if o.typ)
+        finally:
+            engine.lazy = False
+
+    res = [('FixedEngine.load', load, size),
+           ('FixedEngine.iter_load', iter_load, size),
+           ('FixedEngine.iter_load(bytes_mode)', bytes_mode, size),
+           ('FixedEngine.iter_load(stats)', stats, size),
+           ('FixedEngine.iter_load(lazy)', lazy, size),
+           ('FixedEngine.iter_load+save', save, size)]
+    if workers:
+        def parallel():
+            return sum(1 for _ in engine.iter_load(path, encoding, workers))
+        res.append(('FixedEngine.iter_load(workers=%d)' % workers, parallel,
+                    size))
+    if np is not None and len(engine.records) == 1:
+        def columns():
+            return len(engine.load_columns(path, encoding).values()[0])
+        res.append(('FixedEngine.load_columns', columns, size))
+    return res
+
+
+def report(name, rows, seconds, peak_kb, size=None):
+    rate = rows / seconds if seconds else float('inf')
+    mb = '%10.2f' % (size / seconds / 2 ** 20) if size and seconds else \
+         '%10s' % '-'
+    print '%-38s %10d %12.0f %s %10.1f' % (name, rows, rate, mb,
+                                           peak_kb / 1024.0)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmark pypfp parsing and serialization')
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--width', type=int, default=200)
+    parser.add_argument('--mix', default=DEFAULT_MIX,
+                        help='field mix as type=weight, types: %s'
+                             % ', '.join(sorted(FIELD_TYPES)))
+    parser.add_argument('--types', type=int, default=1,
+                        help='number of record types')
+    parser.add_argument('--samples', action='store_true',
+                        help='use the records of samples/records.py')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--only', default='',
+                        help='run benchmarks whose name contains this')
+    args = parser.parse_args(args)
+
+    if args.samples:
+        engine = sample_engine()
+    else:
+        engine = make_engine(args.types, args.width, args.mix)
+    fd, path = tempfile.mkstemp(suffix='.txt')
+    os.close(fd)
+    try:
+        generate_file(path, engine, args.rows, args.seed)
+        benchmarks = (converter_benchmarks(args.rows, args.seed) +
+                      record_benchmarks(engine, path) +
+                      engine_benchmarks(engine, path, args.workers))
+        print '%d rows, %.1f MB, %d record type(s)' % (
+            args.rows, os.path.getsize(path) / 2.0 ** 20, len(engine.records))
+        print '%-38s %10s %12s %10s %10s' % ('benchmark', 'rows', 'rows/s',
+                                             'MB/s', 'peak MB')
+        for name, func, size in benchmarks:
+            if args.only in name:
+                res = measure(func)
+                if res is None:
+                    print '%-38s failed' % name
+                else:
+                    report(name, res[0], res[1], res[2], size)
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
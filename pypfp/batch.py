@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import glob
+import argparse
+import importlib
+import multiprocessing
+from collections import namedtuple, defaultdict
+from timeit import default_timer
+
+from pypfp.core import FixedEngine, RecordMetaClass
+from pypfp.formats import WRITERS, record_writer
+from pypfp.parallel import _results
+from pypfp.rejects import ON_ERROR, make_rejects, reason
+from pypfp.stats import LoadCounts
+from pypfp.streams import EXTENSIONS
+
+# lines is a dict of line counts by record name and error the reason the
+# file failed, if it did
+FileSummary = namedtuple('FileSummary', 'path lines unmatched filtered '
+                                        'rejected bytes seconds output error')
+
+_worker = {}
+
+
+def expand_inputs(inputs):
+    # paths of the files of a glob, a directory or a list of them, sorted
+    # within each one
+    if isinstance(inputs, basestring):
+        inputs = [inputs]
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            found = [os.path.join(item, name) for name in os.listdir(item)]
+        else:
+            found = glob.glob(item)
+        paths.extend(sorted(p for p in found if os.path.isfile(p)))
+    return paths
+
+
+def output_path(path, output_dir, format):
+    name = os.path.basename(path)
+    for extension in EXTENSIONS:
+        if name.lower().endswith(extension):
+            name = name[:-len(extension)]
+    return os.path.join(output_dir, os.path.splitext(name)[0] + '.' + format)
+
+
+def engine_from_spec(spec, selector_slice=None):
+    # 'module:name' of a FixedEngine, a Record or a list of them, or
+    # 'module' for all the records defined in it
+    module_name, _, name = spec.partition(':')
+    module = importlib.import_module(module_name)
+    if name:
+        obj = getattr(module, name)
+    else:
+        obj = [v for v in vars(module).values()
+               if isinstance(v, RecordMetaClass) and
+               v.__module__ == module.__name__ and
+               v._record_options.fields]
+        obj.sort(key=lambda r: r._record_options.selector_string)
+    if isinstance(obj, FixedEngine):
+        return obj
+    if isinstance(obj, RecordMetaClass):
+        obj = [obj]
+    if not obj:
+        raise ValueError('No records in %s' % spec)
+    if len(obj) == 1:
+        return FixedEngine(list(obj))
+    return FixedEngine(list(obj), selector_slice=selector_slice,
+                       selector_prefix=selector_slice is None)
+
+
+def _process(engine, options, mode, path, output=None, format=None):
+    # loads a file, keeping its records, writing them to output or only
+    # counting them, and sums it up
+    lines = defaultdict(int)
+    objs = [] if mode == 'records' else None
+    rejects = make_rejects(options['on_error'], None, options['max_errors'],
+                           options['encoding'])
+    counts = LoadCounts()
+    start = default_timer()
+    try:
+        loaded = engine.iter_load(path, rejects=rejects, counts=counts,
+                                  **options)
+        if mode == 'convert':
+            with record_writer(format, engine, output) as writer:
+                for obj in loaded:
+                    lines[type(obj).__name__] += 1
+                    writer.write(obj)
+        else:
+            for obj in loaded:
+                lines[type(obj).__name__] += 1
+                if objs is not None:
+                    objs.append(obj)
+        error = None
+    except Exception, e:
+        if options['on_error'] == 'raise':
+            raise
+        # the file is left out of merged records and outputs
+        error = reason(e)
+        objs = [] if objs is not None else None
+        if output is not None and os.path.exists(output):
+            os.remove(output)
+    return objs, FileSummary(path, dict(lines), counts.unmatched,
+                             counts.filtered,
+                             rejects.count if rejects else 0,
+                             os.path.getsize(path),
+                             default_timer() - start, output, error)
+
+
+def _init_worker(engine, options):
+    _worker['engine'] = engine
+    _worker['options'] = options
+
+
+def _process_task(task):
+    return _process(_worker['engine'], _worker['options'], *task)
+
+
+class Batch(object):
+    # the files of a glob, directory or list of them loaded with the same
+    # engine, in a pool of workers processes if workers > 1. At most two
+    # files per worker are in flight, so memory depends on the size of the
+    # files, not on how many there are. Unless on_error is 'raise', lines
+    # that fail are skipped and files that fail are summed up with the
+    # error and left out. Inputs that match no file are an error, so a
+    # wrong path isn't taken for a batch with nothing to do
+
+    def __init__(self, engine, inputs, workers=None, ordered=True,
+                 encoding='utf-8', bytes_mode=False, on_error='raise',
+                 max_errors=None, fields=None, where=None):
+        assert on_error in ON_ERROR
+        self.engine = engine
+        self.paths = expand_inputs(inputs)
+        if not self.paths:
+            raise ValueError('No files match %s' % (
+                inputs if isinstance(inputs, basestring)
+                else ', '.join(inputs)))
+        self.workers = workers
+        self.ordered = ordered
+        self.options = dict(encoding=encoding, bytes_mode=bytes_mode,
+                            on_error=on_error, max_errors=max_errors,
+                            fields=fields, where=where)
+        # the FileSummary of the files done, in the order they finished
+        self.summaries = []
+
+    def _run(self, tasks):
+        self.summaries = []
+        if self.workers > 1:
+            pool = multiprocessing.Pool(self.workers, _init_worker,
+                                        (self.engine, self.options))
+            try:
+                for index, ok, res in _results(
+                        pool, enumerate((_process_task, t) for t in tasks),
+                        self.workers, self.ordered):
+                    if not ok:
+                        raise res
+                    self.summaries.append(res[1])
+                    yield res
+                pool.close()
+            finally:
+                pool.terminate()
+                pool.join()
+        else:
+            for task in tasks:
+                res = _process(self.engine, self.options, *task)
+                self.summaries.append(res[1])
+                yield res
+
+    def records(self):
+        # the records of all the files, merged in order of files unless
+        # not ordered
+        for objs, summary in self._run(('records', p) for p in self.paths):
+            for obj in objs:
+                yield obj
+
+    def convert(self, output_dir, format='jsonl'):
+        # writes the records of each file to a file of the same name in
+        # output_dir, and gives their summaries
+        if format not in WRITERS:
+            raise ValueError('Unknown format: %s' % format)
+        outputs = [output_path(p, output_dir, format) for p in self.paths]
+        if len(set(outputs)) < len(outputs):
+            raise ValueError('Files of the same name would be written to '
+                             'the same output')
+        if not os.path.isdir(output_dir):
+            os.makedirs(output_dir)
+        tasks = (('convert', p, o, format)
+                 for p, o in zip(self.paths, outputs))
+        for objs, summary in self._run(tasks):
+            yield summary
+
+    def summarize(self):
+        for objs, summary in self._run(('summary', p) for p in self.paths):
+            yield summary
+
+
+def report(summary):
+    lines = sum(summary.lines.values())
+    rate = lines / summary.seconds if summary.seconds else 0
+    line = '%-40s %10d %8d %8d %10.0f' % (summary.path, lines,
+                                          summary.unmatched, summary.rejected,
+                                          rate)
+    if summary.error:
+        line += '  ' + summary.error
+    return line
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description='Load fixed width files with the same records')
+    parser.add_argument('records',
+                        help='module:name of a FixedEngine, a Record or a '
+                             'list of them, or a module of records')
+    parser.add_argument('inputs', nargs='+', help='files, globs or dirs')
+    parser.add_argument('--mode', choices=('convert', 'summary'),
+                        default='summary')
+    parser.add_argument('--output-dir', help='where converted files go')
+    parser.add_argument('--format', choices=sorted(WRITERS), default='jsonl')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--encoding', default='utf-8')
+    parser.add_argument('--on-error', choices=ON_ERROR, default='raise')
+    args = parser.parse_args(args)
+    if args.mode == 'convert' and not args.output_dir:
+        parser.error('--output-dir is required to convert')
+
+    failed = 0
+    try:
+        batch = Batch(engine_from_spec(args.records), args.inputs,
+                      args.workers, ordered=False, encoding=args.encoding,
+                      on_error=args.on_error)
+        if args.mode == 'convert':
+            summaries = batch.convert(args.output_dir, args.format)
+        else:
+            summaries = batch.summarize()
+        print '%-40s %10s %8s %8s %10s' % ('file', 'lines', 'unmatch',
+                                           'rejected', 'lines/s')
+        for summary in summaries:
+            print report(summary)
+            failed += summary.error is not None
+    except (ValueError, IOError, ImportError), e:
+        sys.stderr.write('%s: %s\n' % (parser.prog, e))
+        return 1
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import argparse
+from timeit import default_timer
+
+from pypfp.batch import engine_from_spec
+from pypfp.formats import WRITERS, record_writer
+from pypfp.rejects import ON_ERROR, make_rejects
+from pypfp.streams import EXTENSIONS
+
+
+def output_format(path):
+    # by the extension of the path, under that of its compression
+    name = path.lower()
+    for extension in EXTENSIONS:
+        if name.endswith(extension):
+            name = name[:-len(extension)]
+    extension = os.path.splitext(name)[1][1:]
+    return extension if extension in WRITERS else 'jsonl'
+
+
+def selector_slice(value):
+    start, _, end = value.partition(':')
+    try:
+        return int(start), int(end)
+    except ValueError:
+        raise argparse.ArgumentTypeError('expected start:end, got %s' % value)
+
+
+class Progress(object):
+    # throughput of a conversion, reported to out every interval seconds
+    # (if any) and when done
+
+    def __init__(self, out, size=None, interval=None):
+        self.out = out
+        self.size = size
+        self.interval = interval
+        self.rows = 0
+        self.start = self._last = default_timer()
+
+    def add(self, rows=1):
+        self.rows += rows
+        if self.interval and self.rows % 1000 == 0:
+            now = default_timer()
+            if now - self._last >= self.interval:
+                self._last = now
+                self.report()
+
+    def report(self):
+        seconds = default_timer() - self.start
+        rate = self.rows / seconds if seconds else 0
+        line = '%d rows in %.1fs, %.0f rows/s' % (self.rows, seconds, rate)
+        if self.size is not None and seconds:
+            line += ', %.1f MB/s' % (self.size / seconds / 2 ** 20)
+        self.out.write(line + '\n')
+        self.out.flush()
+
+
+def convert(engine, input, output, format, workers=None, encoding='utf-8',
+            bytes_mode=False, on_error='raise', rejects=None,
+            max_errors=None, progress=None):
+    # streams the records of input (a path or binary stream) to output
+    # in format; gives the number of records written
+    objs = engine.iter_load(input, encoding, workers, bytes_mode=bytes_mode,
+                            on_error=on_error, rejects=rejects,
+                            max_errors=max_errors)
+    with record_writer(format, engine, output) as writer:
+        for obj in objs:
+            writer.write(obj)
+            if progress is not None:
+                progress.add()
+    return writer.count
+
+
+def main(args=None, stdin=None, stdout=None, stderr=None):
+    stdin = stdin or sys.stdin
+    stdout = stdout or sys.stdout
+    stderr = stderr or sys.stderr
+    parser = argparse.ArgumentParser(
+        prog='pypfp',
+        description='Convert fixed width files to CSV, JSON Lines or '
+                    'Parquet')
+    parser.add_argument('records',
+                        help='module:name of a FixedEngine, a Record or a '
+                             'list of them, or a module of records')
+    parser.add_argument('input', help='file to convert (may be gzip, bz2 '
+                                      'or xz compressed), - for stdin')
+    parser.add_argument('-o', '--output', default='-',
+                        help='file to write (compressed as told by its '
+                             'extension), - for stdout')
+    parser.add_argument('-f', '--format', choices=sorted(WRITERS),
+                        help='output format, by default by the output '
+                             'extension or jsonl')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--encoding', default='utf-8')
+    parser.add_argument('--bytes-mode', action='store_true',
+                        help='slice undecoded lines (single byte '
+                             'encodings only)')
+    parser.add_argument('--selector-slice', type=selector_slice,
+                        help='start:end of the record selector')
+    parser.add_argument('--on-error', choices=ON_ERROR, default='raise')
+    parser.add_argument('--rejects', help='file for the rejected lines')
+    parser.add_argument('--max-errors', type=int, default=None)
+    parser.add_argument('--progress', type=float, default=None,
+                        metavar='SECONDS',
+                        help='report throughput every SECONDS')
+    parser.add_argument('-q', '--quiet', action='store_true')
+    args = parser.parse_args(args)
+
+    input = stdin if args.input == '-' else args.input
+    output = stdout if args.output == '-' else args.output
+    format = args.format or output_format(args.output)
+    if format == 'parquet' and output is stdout:
+        parser.error('Parquet needs an output file')
+    rejects = make_rejects(args.on_error, args.rejects, args.max_errors,
+                           args.encoding)
+    try:
+        engine = engine_from_spec(args.records, args.selector_slice)
+        size = None if input is stdin else os.path.getsize(input)
+        progress = Progress(stderr, size, args.progress)
+        convert(engine, input, output, format, args.workers, args.encoding,
+                args.bytes_mode, args.on_error, rejects, progress=progress)
+    except (ValueError, IOError, OSError, ImportError), e:
+        stderr.write('pypfp: %s\n' % e)
+        return 1
+    if not args.quiet:
+        progress.report()
+        if rejects is not None and rejects.count:
+            stderr.write('%d rejected lines\n' % rejects.count)
+    return 0
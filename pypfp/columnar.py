@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+import re
+from collections import OrderedDict
+from pypfp.converters import Int, BigInt, Float, String
+from pypfp.streams import file_compression, read_chunks
+
+_non_ascii = re.compile('[\x80-\xff]')
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+
+def _strip(column, converter, encoding):
+    fill = converter.fill.encode(encoding)
+    if converter.align == '<':
+        return np.char.rstrip(column, fill)
+    if converter.align == '^':
+        return np.char.strip(column, fill)
+    return np.char.lstrip(column, fill)
+
+
+def _to_int(column):
+    column = column.copy()
+    column[column == ''] = '0'
+    return column.astype(np.int64)
+
+
+def _generic(column, converter, encoding):
+    return np.array([converter.to_value(s.decode(encoding)) for s in column],
+                    dtype=object)
+
+
+def convert_column(column, converter, encoding='utf-8'):
+    t = type(converter)
+    if (converter.clean_function is not None or
+            getattr(converter, 'null_string', None) is not None or
+            getattr(converter, 'align', None) == '='):
+        return _generic(column, converter, encoding)
+    if t in (Int, BigInt):
+        return _to_int(_strip(column, converter, encoding))
+    if t is Float:
+        column = _strip(column, converter, encoding)
+        if converter.decimal_separator == '':
+            return _to_int(column) / 10.0 ** converter.precision
+        if converter.decimal_separator != '.' and len(column):
+            sep = converter.decimal_separator.encode(encoding)
+            column = np.char.replace(column, sep, '.')
+        column = column.copy()
+        column[(column == '') | (column == '.')] = '0'
+        return column.astype(np.float64)
+    if t is String:
+        if not len(column):
+            return np.zeros(0, 'U%d' % converter.width)
+        column = np.char.decode(column, encoding)
+        if converter.align == '<':
+            return np.char.rstrip(column, converter.fill)
+        if converter.align == '>':
+            return np.char.lstrip(column, converter.fill)
+        return np.char.strip(column, converter.fill)
+    return _generic(column, converter, encoding)
+
+
+def line_matrix(data):
+    # one row of bytes per line; every line must have the same byte length,
+    # so multi-byte encodings only work for files with single-byte content
+    if not data:
+        return np.zeros((0, 0), np.uint8)
+    stride = data.find('\n') + 1
+    if not data.endswith('\n'):
+        data += '\r\n' if data[stride - 2:stride] == '\r\n' else '\n'
+        stride = stride or len(data)
+    if len(data) % stride:
+        raise ValueError('Lines are not of constant length')
+    matrix = np.frombuffer(data, np.uint8).reshape(-1, stride)
+    if not (matrix[:, -1] == ord('\n')).all():
+        raise ValueError('Lines are not of constant length')
+    return matrix
+
+
+def record_columns(record, matrix, encoding='utf-8'):
+    res = OrderedDict()
+    fields = record._record_options.fields
+    if not len(matrix):
+        width = max([f.start + f.width for f in fields] + [0])
+        matrix = np.zeros((0, width + 1), np.uint8)
+    for field in fields:
+        end = field.start + field.width
+        if end >= matrix.shape[1]:
+            raise ValueError('Line too short for field %s' % field.name)
+        column = matrix[:, field.start:end].copy().view('S%d' % field.width)
+        values = convert_column(column.ravel(), field.converter, encoding)
+        if field.validator:
+            for value in set(values.tolist()):
+                field.validator(value)
+        res[field.name] = values
+    return res
+
+
+def group_matrix(record, lines):
+    width = max([f.start + f.width for f in record._record_options.fields])
+    return line_matrix(''.join(line[:width].ljust(width) + '\n'
+                               for line in lines))
+
+
+def check_offsets(data, encoding):
+    # fields are sliced at byte offsets, which are their character offsets
+    # in single byte encodings, or in ascii compatible ones for ascii data
+    from pypfp.core import check_single_byte
+    try:
+        check_single_byte(encoding)
+    except ValueError:
+        if u'\n0aZ'.encode(encoding) != '\n0aZ' or _non_ascii.search(data):
+            raise ValueError('Columns of non ascii data need a single byte '
+                             'encoding, not %s' % encoding)
+
+
+def load_columns(engine, path, encoding='utf-8'):
+    # a dict of columns for single record engines, otherwise a dict of
+    # them by record class, grouping the lines before decoding each group
+    if np is None:
+        raise ImportError('numpy is required to load columns')
+    if file_compression(path):
+        data = ''.join(read_chunks(path))
+    else:
+        with open(path, 'rb') as f:
+            data = f.read()
+    check_offsets(data, encoding)
+    if len(engine.records) == 1:
+        return record_columns(engine.records[0], line_matrix(data), encoding)
+    groups = engine.group_lines(data.splitlines(),
+                                engine.byte_selector(encoding))
+    return dict((r, record_columns(r, group_matrix(r, lines), encoding))
+                for r, lines in groups.items())
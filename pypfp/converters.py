@@ -1,5 +1,6 @@
 # -*- coding: utf-8 *-*
 import logging
+import sys
 from datetime import datetime
 import decimal
 
@@ -44,6 +45,10 @@ class Number(Converter):
         super(Number, self).__init__(width, fill, null_string, default,
                                     clean_function)
         self.align = align
+        # unsigned raw strings can be handed to int/float directly, falling
+        # back to stripping fill and sign only when they reject it
+        self.fast_path = (null_string is None and clean_function is None and
+                          fill in '0 ')
 
     def to_string(self, value):
         if value is None and self.null_string is None:
@@ -68,18 +73,27 @@ class Int(Number):
                     default=None, clean_function=None):
         super(Int, self).__init__(width, null_string, fill, align, default,
                                 clean_function)
+        self.format_spec = '%s%s%dd' % (fill, align, width)
 
     def to_string(self, value):
         r = super(Int, self).to_string(value)
         if r:
             return r
         try:
-            return '{0:{x.fill}{x.align}{x.width}d}'.format(value, x=self)
+            return format(value, self.format_spec)
         except Exception, e:
             logger.error(e)
             raise
 
     def to_value(self, string):
+        if self.fast_path and '-' not in string:
+            try:
+                return int(string)
+            except ValueError:
+                pass
+        return self._to_value(string)
+
+    def _to_value(self, string):
         r = super(Int, self).to_value(string)
         if r is None:
             return None
@@ -96,6 +110,8 @@ class BigInt(Int):
 
 
 class Float(Number):
+    # widest implied decimal string whose digits convert exactly to a float
+    fast_implied_width = 15
 
     def __init__(self, width, null_string=None, fill='0', align='>',
                 precision=6, decimal_separator='.', default=None,
@@ -105,6 +121,11 @@ class Float(Number):
                                     clean_function)
         self.precision = precision
         self.decimal_separator = decimal_separator
+        self.format_spec = '%s%s%d.%df' % (fill, align, self.real_width,
+                                           precision)
+        self.scale = 10.0 ** precision
+        self.fast_path = self.fast_path and (decimal_separator == '.' or (
+            decimal_separator == '' and width <= self.fast_implied_width))
 
     @property
     def real_width(self):
@@ -114,33 +135,71 @@ class Float(Number):
         r = super(Float, self).to_string(value)
         if r:
             return r
-        f = '{0:{x.fill}{x.align}{x.real_width}.{x.precision}f}'
-        return f.format(value, x=self).replace('.', self.decimal_separator)
+        return format(value, self.format_spec).replace('.',
+                                                       self.decimal_separator)
 
     def to_value(self, string):
+        if self.fast_path and '-' not in string:
+            try:
+                if self.decimal_separator == '':
+                    # both are exact floats, so the division is rounded
+                    # just like float() rounds the decimal string
+                    return int(string) / self.scale
+                return float(string)
+            except ValueError:
+                pass
+        return self._to_value(string)
+
+    def _number_string(self, string):
         r = super(Float, self).to_value(string)
         if r is None:
             return None
         string, sign = r
-        if self.decimal_separator == '':
+        if self.decimal_separator == '' and self.precision:
+            # the fill may have taken zeros below the point
+            if string:
+                string = string.rjust(self.precision + 1, '0')
             string = string[:-self.precision] + '.' + \
                                             string[-self.precision:]
-        elif self.decimal_separator != '.':
+        elif self.decimal_separator not in ('.', ''):
             string = string.replace(self.decimal_separator, '.')
         if self.clean_function:
             string = self.clean_function(string)
+        return string, sign
+
+    def _to_value(self, string):
+        r = self._number_string(string)
+        if r is None:
+            return None
+        string, sign = r
         if string in ('', '.'):
             return 0
         return float(string) * sign
 
 
 class Decimal(Float):
+    fast_implied_width = sys.maxsize
 
     def to_value(self, string):
-        r = super(Decimal, self).to_value(string)
+        if self.fast_path and '-' not in string:
+            try:
+                if self.decimal_separator == '':
+                    return decimal.Decimal(int(string)).scaleb(
+                                                            -self.precision)
+                return decimal.Decimal(string)
+            except (ValueError, decimal.InvalidOperation):
+                pass
+        return self._to_value(string)
+
+    def _to_value(self, string):
+        r = self._number_string(string)
         if r is None:
             return None
-        return decimal.Decimal(r)
+        string, sign = r
+        if string in ('', '.'):
+            return decimal.Decimal(0)
+        value = decimal.Decimal(string)
+        return -value if sign < 0 else value
 
 
 class String(Converter):
@@ -152,9 +211,10 @@ class String(Converter):
                                     clean_function)
         self.truncate = truncate
         self.align = align
+        self.format_spec = u'%s%s%ds' % (fill, align, width)
 
     def to_string(self, value):
-        string = u'{0:{x.fill}{x.align}{x.width}s}'.format(value, x=self)
+        string = format(value, self.format_spec)
         if (len(string) > self.width and not self.truncate):
             raise ValueError('Value too long: ' + string)
         return string[:self.width]
@@ -166,31 +226,97 @@ class String(Converter):
         return string
 
 
+def _parse_ymd(s):
+    return datetime(int(s[:4]), int(s[4:6]), int(s[6:8]))
+
+
+def _parse_dmy(s):
+    return datetime(int(s[4:8]), int(s[2:4]), int(s[:2]))
+
+
+def _parse_ymdhms(s):
+    return datetime(int(s[:4]), int(s[4:6]), int(s[6:8]),
+                    int(s[8:10]), int(s[10:12]), int(s[12:14]))
+
+# formats parsed by slicing the digits instead of calling strptime, with the
+# length of the strings they apply to
+_fast_parsers = {
+    '%Y%m%d': (8, _parse_ymd),
+    '%d%m%Y': (8, _parse_dmy),
+    '%Y%m%d%H%M%S': (14, _parse_ymdhms),
+}
+
+
 class DateTime(Converter):
 
     def __init__(self, width, str_format, null_string=None, fill=' ',
-                align='<', default=None, clean_function=None):
+                align='<', default=None, clean_function=None,
+                cache_size=8192):
         assert align in '<>^'
         super(DateTime, self).__init__(width, fill, null_string, default,
                                     clean_function)
         self.align = align
         self.str_format = str_format
+        self.format_spec = '%s%s%ds' % (fill, align, width)
+        # values and strings already converted, as the same dates tend to
+        # repeat all over a file; at most cache_size of each are kept
+        self.cache_size = cache_size
+        self._values = [{}, {}]
+        self._strings = [{}, {}]
+        self._fast_length, self._fast_parser = _fast_parsers.get(str_format,
+                                                                 (None, None))
+
+    def _cache(self, caches, key, value):
+        # an approximate LRU in two generations of half the size: when the
+        # newer is full it replaces the older, whose entries not used since
+        # are dropped; hits in the older are moved to the newer
+        if self.cache_size:
+            new = caches[0]
+            if len(new) >= max(1, self.cache_size // 2):
+                caches[1] = new
+                new = caches[0] = {}
+            new[key] = value
+
+    def _cached(self, caches, key):
+        # a miss of the newer generation
+        value = caches[1].get(key)
+        if value is not None:
+            self._cache(caches, key, value)
+        return value
 
     def to_string(self, value):
         if value is None and self.null_string is None:
             raise ValueError('None value not allowed')
         elif not self.null_string is None:
             return self.null_string
-        s = value.strftime(self.str_format)
-        res = '{0:{x.fill}{x.align}{x.width}s}'.format(s, x=self)
-        if len(res) > self.width:
-            raise ValueError('Value too long')
+        # aware values equal in UTC but in other zones are other strings
+        tz = getattr(value, 'tzinfo', None)
+        key = value if tz is None else (value, tz)
+        res = self._strings[0].get(key) or self._cached(self._strings, key)
+        if res is None:
+            s = value.strftime(self.str_format)
+            res = format(s, self.format_spec)
+            if len(res) > self.width:
+                raise ValueError('Value too long')
+            self._cache(self._strings, key, res)
         return res
 
+    def _parse(self, string):
+        # the value of an already stripped and cleaned string
+        value = self._values[0].get(string) or \
+            self._cached(self._values, string)
+        if value is None:
+            if len(string) == self._fast_length and string.isdigit():
+                value = self._fast_parser(string)
+            else:
+                value = datetime.strptime(string, self.str_format)
+            self._cache(self._values, string, value)
+        return value
+
     def to_value(self, string):
         if string == self.null_string:
             return None
         string = _aligns[self.align](string, self.fill)
         if self.clean_function:
             string = self.clean_function(string)
-        return datetime.strptime(string, self.str_format)
+        return self._parse(string)
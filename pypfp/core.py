@@ -1,7 +1,15 @@
 # -*- coding: utf-8 *-*
 
 from pypfp.converters import *
+from pypfp.readers import MappedReader, ResumableReader
+from pypfp.parallel import iter_parallel
+from pypfp.stats import LoadStats, LoadCounts
+from pypfp.rejects import make_rejects
+from pypfp.streams import read_chunks, open_output
 import codecs
+import io
+
+CHUNK_SIZE = 64 * 1024
 
 
 class Field(object):
@@ -43,10 +51,15 @@ def value_validator(valid_value):
 
 class RecordOptions(object):
 
-    def __init__(self, fill=u' ', selector_string=u'', stack_function=None):
+    def __init__(self, fill=u' ', selector_string=u'', stack_function=None,
+                 compact=False):
         self.fields = []
         self.fill = fill
         self.selector_string = selector_string
+        self.compact = compact
+        # parsers of byte lines, by encoding
+        self.bytes_parsers = {}
+        self.lazy_class = None
         if stack_function is None:
             self.stack_function = lambda x: x + 1
         else:
@@ -57,14 +70,299 @@ class RecordOptions(object):
                         for k, v in self.__dict__.items())
 
 
+_strip_methods = {'<': 'rstrip', '>': 'lstrip', '^': 'strip', '=': 'lstrip'}
+
+
+def _encoded(string, encoding):
+    return string if encoding is None else string.encode(encoding)
+
+
+def _conversion_source(converter, i, ns, encoding=None):
+    # source lines that turn the raw slice held in `v` into its value, or
+    # None when the converter has no inline version. With an encoding the
+    # slice is bytes in that encoding
+    if converter.clean_function is not None:
+        return None
+    strip = 'v = v.%s(%r)' % (_strip_methods[converter.align],
+                              _encoded(converter.fill, encoding))
+    t = type(converter)
+    if t in (Int, BigInt, Float) and converter.fast_path:
+        ns['_c%d' % i] = converter._to_value
+        fallback = 'v = _c%d(v)' % i
+        if t is Float and converter.decimal_separator == '':
+            ns['_scale%d' % i] = converter.scale
+            fast = 'v = int(v) / _scale%d' % i
+        else:
+            fast = 'v = %s(v)' % ('float' if t is Float else 'int')
+        return ["if '-' in v:", '    ' + fallback, 'else:',
+                '    try:', '        ' + fast, '    except ValueError:',
+                '        ' + fallback]
+    if t in (Int, BigInt) and converter.align != '=':
+        return [strip, 'v = int(v) if v else 0']
+    if t is Float and converter.align != '=':
+        lines = [strip]
+        if converter.decimal_separator == '' and converter.precision:
+            p = converter.precision
+            lines.append("v = v.rjust(%d, '0') if v else v" % (p + 1))
+            lines.append("v = v[:-%d] + '.' + v[-%d:]" % (p, p))
+        elif converter.decimal_separator not in ('.', ''):
+            lines.append("v = v.replace(%r, '.')"
+                         % _encoded(converter.decimal_separator, encoding))
+        lines.append("v = float(v) if v not in ('', '.') else 0")
+        return lines
+    if t is String:
+        return [strip]
+    if t is DateTime:
+        ns['_c%d' % i] = converter._parse
+        return [strip, 'v = _c%d(v)' % i]
+    return None
+
+
+def _from_bytes(converter):
+    # numbers and dates are parsed straight from the bytes of the line
+    return (converter.clean_function is None and
+            isinstance(converter, (Number, DateTime)))
+
+
+def _values_source(fields, ns, encoding=None):
+    # source lines that leave the value of the i-th field in `v<i>`. With
+    # an encoding `line` is bytes, and it is decoded once (into `text`)
+    # only if some field is not parsed from bytes
+    src = []
+    if encoding is not None and not all(_from_bytes(f.converter)
+                                        for f in fields):
+        src.append('text = line.decode(_enc)')
+    for i, field in enumerate(fields):
+        converter = field.converter
+        raw = encoding is not None and _from_bytes(converter)
+        src.append('v = %s[%d:%d]' % ('text' if encoding and not raw
+                                      else 'line', field.start,
+                                      field.start + field.width))
+        field_encoding = encoding if raw else None
+        lines = _conversion_source(converter, i, ns, field_encoding)
+        if lines is None:
+            ns['_c%d' % i] = converter.to_value
+            lines = ['v = _c%d(v)' % i]
+        elif getattr(converter, 'null_string', None) is not None:
+            ns['_null%d' % i] = _encoded(converter.null_string,
+                                         field_encoding)
+            lines = (['if v == _null%d:' % i, '    v = None', 'else:'] +
+                     ['    ' + l for l in lines])
+        src.extend(lines)
+        if field.validator:
+            ns['_val%d' % i] = field.validator
+            src.append('_val%d(v)' % i)
+        src.append('v%d = v' % i)
+    return src
+
+
+def _compile(name, src, ns):
+    code = '\n'.join(src)
+    exec compile(code, '<pypfp %s>' % name, 'exec') in ns
+    return ns[name]
+
+
+def _object_source(fields, compact, ns, encoding=None):
+    src = _values_source(fields, ns, encoding)
+    # every slot is assigned below, so compact records skip __init__
+    src.insert(0, 'obj = _new(cls)' if compact else 'obj = cls()')
+    src.extend('obj.%s = v%d' % (f.name, i) for i, f in enumerate(fields))
+    src.append('return obj')
+    return src
+
+
+def compile_parser(fields, compact=False, encoding=None):
+    # with an encoding the parser takes lines of bytes in that encoding
+    ns = {'_new': object.__new__, '_enc': encoding}
+    src = _object_source(fields, compact, ns, encoding)
+    return _compile('to_value',
+                    ['def to_value(cls, line):'] + ['    ' + l for l in src],
+                    ns)
+
+
+class Prefix(object):
+    # where spec for the raw slices that start with prefix
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+
+
+def _where_source(field, spec, i, ns, encoding=None):
+    # condition on the raw slice of field: equal to the string of a value,
+    # in the strings of a set of values, starting with a Prefix or true for
+    # a function of the slice
+    start, end = field.start, field.start + field.width
+    name = '_w%d' % i
+    if isinstance(spec, Prefix):
+        if len(spec.prefix) > field.width:
+            raise ValueError('Prefix longer than field %s' % field.name)
+        ns[name] = _encoded(spec.prefix, encoding)
+        return 'line.startswith(%s, %d)' % (name, start)
+    if callable(spec):
+        ns[name] = spec
+        return '%s(line[%d:%d])' % (name, start, end)
+    to_string = field.converter.to_string
+    if isinstance(spec, (set, frozenset, list, tuple)):
+        ns[name] = frozenset(_encoded(to_string(v), encoding) for v in spec)
+        return 'line[%d:%d] in %s' % (start, end, name)
+    # strings of values are as wide as the field
+    ns[name] = _encoded(to_string(spec), encoding)
+    return 'line.startswith(%s, %d)' % (name, start)
+
+
+def compile_query(record, fields=None, where=None, encoding=None,
+                  lazy=False):
+    # parser that gives None for the lines not matching where, checked on
+    # the raw slices before any conversion, and converts only the given
+    # fields (the others are left to the record defaults)
+    options = record._record_options
+    by_name = dict((f.name, f) for f in options.fields)
+    where = where or {}
+    if not all(name in by_name for name in where):
+        return lambda cls, line: None
+    ns = {'_new': object.__new__, '_enc': encoding}
+    conditions = [_where_source(by_name[name], spec, i, ns, encoding)
+                  for i, (name, spec) in enumerate(sorted(where.items()))]
+    src = []
+    if conditions:
+        src.extend(['if not (%s):' % ' and '.join(conditions),
+                    '    return None'])
+    if lazy:
+        ns['_lazy'] = record.lazy_value
+        src.append('return _lazy(%s)' % ('line' if encoding is None
+                                         else 'line.decode(_enc)'))
+    elif fields is None:
+        src.extend(_object_source(options.fields, options.compact, ns,
+                                  encoding))
+    else:
+        src.extend(_object_source([f for f in options.fields
+                                   if f.name in fields], False, ns, encoding))
+    return _compile('to_value',
+                    ['def to_value(cls, line):'] + ['    ' + l for l in src],
+                    ns)
+
+
+def _inline_spec(converter):
+    # format spec that renders a value exactly like converter.to_string
+    # (given the final width check), or None when it has to be called
+    if converter.fill in '{}':
+        return None
+    t = type(converter)
+    if t in (Int, BigInt) and converter.null_string is None:
+        return converter.format_spec
+    if (t in (Float, Decimal) and converter.null_string is None and
+            converter.decimal_separator == '.'):
+        return converter.format_spec
+    if t is String:
+        if converter.truncate:
+            return converter.format_spec[:-1] + u'.%ds' % converter.width
+        return converter.format_spec
+    return None
+
+
+def _format_source(options, value, ns):
+    # format string for a whole line plus the argument expressions, value
+    # being the expression (with a %(i)d and %(name)s) of each field value
+    parts, args = [], []
+    last_pos = -1
+    for i, field in enumerate(options.fields):
+        to_fill = field.start - last_pos - 1
+        if to_fill > 0:
+            fill = options.fill * to_fill
+            parts.append(fill.replace(u'{', u'{{').replace(u'}', u'}}'))
+        arg = value % {'i': i, 'name': field.name}
+        spec = _inline_spec(field.converter)
+        if spec is None:
+            ns['_c%d' % i] = field.converter.to_string
+            parts.append(u'{%d:%d}' % (i, field.width))
+            args.append('_c%d(%s)' % (i, arg))
+        else:
+            parts.append(u'{%d:%s}' % (i, spec))
+            args.append(arg)
+        last_pos = field.start + field.width - 1
+    ns['_width'] = last_pos + 1
+    return u''.join(parts), args
+
+
+def compile_serializer(options, from_tuple=False):
+    # from_tuple serializes a sequence of values in field order instead of
+    # the attributes of an object
+    string_format = options.string_format
+    fields = options.fields
+
+    if from_tuple:
+        def generic(obj):
+            return string_format.format(*[x.converter.to_string(v)
+                                          for x, v in zip(fields, obj)])
+    else:
+        def generic(obj):
+            return string_format.format(*[x.to_string(obj) for x in fields])
+
+    ns = {'_generic': generic}
+    value = 'obj[%(i)d]' if from_tuple else 'obj.%(name)s'
+    ns['_format'], args = _format_source(options, value, ns)
+    # a wrong width means an overflow or an invalid value: the generic path
+    # gives the same output or raises the converter's error
+    return _compile('to_string', [
+        'def to_string(obj):',
+        '    try:',
+        '        line = _format.format(%s)' % ', '.join(args),
+        '    except (ValueError, TypeError):',
+        '        return _generic(obj)',
+        '    if len(line) != _width:',
+        '        return _generic(obj)',
+        '    return line'], ns)
+
+
+def _compact_init(defaults):
+    def __init__(self, **kwargs):
+        for name, value in defaults:
+            setattr(self, name, value)
+        for name, value in kwargs.items():
+            setattr(self, name, value)
+    return __init__
+
+
+def _compact_getstate(self):
+    # pickle protocols 0 and 1 need it for classes with __slots__
+    return dict((name, getattr(self, name)) for name in self.__slots__
+                if hasattr(self, name))
+
+
+def _compact_setstate(self, state):
+    for name, value in state.items():
+        setattr(self, name, value)
+
+
+def compile_row_parser(fields):
+    ns = {}
+    src = _values_source(fields, ns)
+    src.append('return (%s)' % ''.join('v%d, ' % i
+                                       for i in range(len(fields))))
+    return _compile('to_tuple',
+                    ['def to_tuple(line):'] + ['    ' + l for l in src], ns)
+
+
 class RecordMetaClass(type):
 
-    meta_confs = ('fill', 'selector_string', 'stack_function')
+    meta_confs = ('fill', 'selector_string', 'stack_function', 'compact')
 
     def __new__(cls, name, bases, attrs):
         cls.init_class(attrs, RecordMetaClass.get_default_value)
+        if attrs['_record_options'].compact:
+            cls.make_compact(attrs)
         return super(RecordMetaClass, cls).__new__(cls, name, bases, attrs)
 
+    @staticmethod
+    def make_compact(attrs):
+        fields = attrs['_record_options'].fields
+        defaults = [(f.name, attrs.pop(f.name)) for f in fields]
+        attrs['__slots__'] = tuple(f.name for f in fields)
+        if '__init__' not in attrs:
+            attrs['__init__'] = _compact_init(defaults)
+        attrs.setdefault('__getstate__', _compact_getstate)
+        attrs.setdefault('__setstate__', _compact_setstate)
+
     @staticmethod
     def get_default_value(field):
         if callable(field.converter.default):
@@ -99,6 +397,13 @@ class RecordMetaClass(type):
             last_pos = v.start + v.width - 1
             _record_options.fields.append(v)
         _record_options.string_format = u''.join(formats)
+        _record_options.parser = compile_parser(_record_options.fields,
+                                                _record_options.compact)
+        _record_options.row_parser = compile_row_parser(
+                                                    _record_options.fields)
+        _record_options.serializer = compile_serializer(_record_options)
+        _record_options.tuple_serializer = compile_serializer(
+                                                _record_options, True)
 
         attrs['_record_options'] = _record_options
 
@@ -106,66 +411,587 @@ class RecordMetaClass(type):
             attrs[field.name] = get_field_value(field)
 
 
+class LazyField(object):
+    # non-data descriptor: the value is converted from the line the first
+    # time it is read and kept in the instance, where it is found from then
+    # on (and where assigned values go)
+
+    def __init__(self, field, default):
+        self.name = field.name
+        self.start = field.start
+        self.end = field.start + field.width
+        self.to_value = field.converter.to_value
+        self.validator = field.validator
+        self.default = default
+
+    def __get__(self, obj, cls):
+        if obj is None:
+            return self.default
+        value = self.to_value(obj._line[self.start:self.end])
+        if self.validator:
+            self.validator(value)
+        obj.__dict__[self.name] = value
+        return value
+
+
+def _unpickle_lazy(record, state):
+    obj = object.__new__(record.lazy_class())
+    obj.__dict__.update(state)
+    return obj
+
+
+def _lazy_reduce(self):
+    return _unpickle_lazy, (type(self).__bases__[0], self.__dict__)
+
+
+def make_lazy_class(record):
+    # a subclass with the same name (found by find_record and isinstance
+    # of the record) that converts its fields on first access
+    if type(record) is not RecordMetaClass:
+        raise TypeError('Only plain records can be lazy')
+    attrs = {'__module__': record.__module__, '__reduce__': _lazy_reduce}
+    for field in record._record_options.fields:
+        attrs[field.name] = LazyField(field, getattr(record, field.name))
+    # created with type.__new__, so the fields are not set up again
+    return type.__new__(RecordMetaClass, record.__name__, (record,), attrs)
+
+
+def lazy_to_string(options, obj):
+    # the fields not read nor assigned are written as they came
+    line = obj._line
+    values = obj.__dict__
+    return options.string_format.format(*[
+        f.converter.to_string(values[f.name]) if f.name in values
+        else line[f.start:f.start + f.width] for f in options.fields])
+
+
 class Record(object):
     __metaclass__ = RecordMetaClass
+    __slots__ = ()
+    # the line of lazy records
+    _line = None
 
     @classmethod
     def to_string(cls, obj):
-        return cls._record_options.string_format.format(*[x.to_string(obj)
-                                        for x in cls._record_options.fields])
+        if getattr(obj, '_line', None) is not None:
+            return lazy_to_string(cls._record_options, obj)
+        return cls._record_options.serializer(obj)
 
     @classmethod
     def to_value(cls, line):
-        obj = cls()
-        for field in cls._record_options.fields:
-            s = line[field.start:field.start + field.width]
-            field.to_value(s, obj)
+        return cls._record_options.parser(cls, line)
+
+    @classmethod
+    def bytes_to_value(cls, line, encoding):
+        options = cls._record_options
+        try:
+            parser = options.bytes_parsers[encoding]
+        except KeyError:
+            check_single_byte(encoding)
+            parser = compile_parser(options.fields, options.compact,
+                                    encoding)
+            options.bytes_parsers[encoding] = parser
+        return parser(cls, line)
+
+    @classmethod
+    def lazy_class(cls):
+        options = cls._record_options
+        if options.lazy_class is None:
+            options.lazy_class = make_lazy_class(cls)
+        return options.lazy_class
+
+    @classmethod
+    def lazy_value(cls, line):
+        # a record that keeps the line and converts each field the first
+        # time it is read, so conversion and validation errors show there
+        obj = object.__new__(cls.lazy_class())
+        obj._line = line
         return obj
 
+    @classmethod
+    def tuple_to_string(cls, values):
+        return cls._record_options.tuple_serializer(values)
+
+    @classmethod
+    def to_tuple(cls, line):
+        return cls._record_options.row_parser(line)
+
+    @classmethod
+    def to_values(cls, lines):
+        parser = cls._record_options.parser
+        return [parser(cls, line) for line in lines]
+
     def __unicode__(self):
         fields = ', '.join([u'{0}: {1}'.format(f.name, getattr(self, f.name))
                             for f in self.__class__._record_options.fields])
         return u'<{0} :: {1}>'.format(self.__class__.__name__, fields)
 
 
+class LineSplitter(object):
+    # same splitting as codecs.open(path).readlines(), for data that comes
+    # in pieces. Without decode the lines are kept as bytes in the given
+    # encoding (and only split on '\n', '\r' and '\r\n')
+
+    def __init__(self, encoding='utf-8', decode=True):
+        self.encoding = encoding
+        self.decode = decode
+        self._decoder = codecs.getincrementaldecoder(encoding)()
+        self._pending = u'' if decode else ''
+
+    def feed(self, data):
+        # the lines completed by data
+        if self.decode and isinstance(data, str):
+            data = self._decoder.decode(data)
+        elif not self.decode and isinstance(data, unicode):
+            data = data.encode(self.encoding)
+        lines = (self._pending + data).splitlines(True)
+        self._pending = self._pending[:0]
+        if lines:
+            # the last line is kept if incomplete, or if it ends with a '\r'
+            # that may be followed by its '\n'
+            last = lines[-1]
+            if last.endswith('\r') or last.splitlines()[0] == last:
+                self._pending = lines.pop()
+        return lines
+
+    def close(self):
+        # the lines left once there is no more data
+        pending = self._pending
+        if self.decode:
+            pending += self._decoder.decode('', True)
+        self._pending = pending[:0]
+        return pending.splitlines(True)
+
+
+def iter_lines(path_or_fileobj, encoding='utf-8', chunk_size=CHUNK_SIZE,
+               decode=True, stats=None, compression='auto',
+               threaded_io=False):
+    splitter = LineSplitter(encoding, decode)
+    for chunk in read_chunks(path_or_fileobj, chunk_size, compression,
+                             threaded_io):
+        if stats is not None:
+            stats.bytes_read += len(chunk)
+        for line in splitter.feed(chunk):
+            yield line
+    for line in splitter.close():
+        yield line
+
+
+def _closing(objs, rejects):
+    try:
+        for obj in objs:
+            yield obj
+    finally:
+        rejects.close()
+
+
+class PushParser(object):
+    # for event loops and callbacks: data is pushed as it arrives and the
+    # records of the lines it completes are returned. Each feed only parses
+    # the lines it completes, so big pushes can be fed from a worker thread
+
+    def __init__(self, engine, encoding='utf-8', bytes_mode=False,
+                 on_error='raise', rejects=None, max_errors=None):
+        if bytes_mode:
+            check_single_byte(encoding)
+        self.engine = engine
+        self.encoding = encoding if bytes_mode else None
+        self.rejects = make_rejects(on_error, rejects, max_errors, encoding)
+        self.line_number = 0
+        self.counts = LoadCounts()
+        self._splitter = LineSplitter(encoding, not bytes_mode)
+
+    def _parse(self, lines):
+        objs = list(self.engine.parse_lines(lines, self.encoding,
+                                            self.rejects,
+                                            self.line_number + 1,
+                                            counts=self.counts))
+        self.line_number += len(lines)
+        return objs
+
+    @property
+    def unmatched(self):
+        return self.counts.unmatched
+
+    def feed(self, data):
+        return self._parse(self._splitter.feed(data))
+
+    def close(self):
+        # the records of a last line without its new line
+        try:
+            return self._parse(self._splitter.close())
+        finally:
+            if self.rejects is not None:
+                self.rejects.close()
+
+
+_single_byte = {}
+
+
+def check_single_byte(encoding):
+    # byte offsets are character offsets only when every byte decodes to
+    # one character on its own, even if followed by bytes that could
+    # continue a multi-byte sequence
+    if encoding not in _single_byte:
+        data = ''.join(chr(i) + c for i in range(256) for c in '@\x80\xa1')
+        _single_byte[encoding] = len(data.decode(encoding, 'replace')) == \
+            len(data)
+    if not _single_byte[encoding]:
+        raise ValueError('Not a single byte encoding: %s' % encoding)
+
+
+class FixedWriter(object):
+
+    def __init__(self, engine, path_or_fileobj, encoding='utf-8',
+                 buffer_size=CHUNK_SIZE, compression='auto',
+                 threaded_io=False):
+        self.engine = engine
+        self.encoding = encoding
+        self.buffer_size = buffer_size
+        self.count = 0
+        self._buffer = []
+        self._buffered = 0
+        # paths are compressed as told by their extension
+        self.file = open_output(path_or_fileobj, compression, threaded_io)
+        self._owns_file = self.file is not path_or_fileobj
+        self._text = isinstance(self.file, io.TextIOBase)
+        self._new_line = u'\n' if self._text else '\n'
+
+    def write(self, obj):
+        record = self.engine.find_record(obj)
+        self.write_line(record.to_string(obj))
+
+    def write_line(self, line):
+        if not self._text:
+            line = line.encode(self.encoding)
+        if self.count:
+            self._buffer.append(self._new_line)
+        self._buffer.append(line)
+        self.count += 1
+        self._buffered += len(line) + 1
+        if self._buffered >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            self.file.write(''.join(self._buffer))
+            self._buffer = []
+            self._buffered = 0
+        # transports of event loops only have write
+        if hasattr(self.file, 'flush'):
+            self.file.flush()
+
+    def close(self):
+        if self.engine.end_with_new_line:
+            self._buffer.append(self._new_line)
+        self.flush()
+        if self._owns_file:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class SelectorDispatcher(object):
+
+    def __init__(self, records, selector_slice=None, encoding=None):
+        self.records = records
+        self.selector_slice = selector_slice
+        self.encoding = encoding
+        keys = [(r._record_options.selector_string, r) for r in records]
+        if encoding is not None:
+            keys = [(k.encode(encoding), r) for k, r in keys]
+        if selector_slice is None:
+            # longest selector_string that prefixes the line wins
+            slices = sorted(set((0, len(k)) for k, r in keys),
+                            key=lambda x: -x[1])
+        elif isinstance(selector_slice[0], int):
+            slices = [tuple(selector_slice)]
+        else:
+            slices = [tuple(x) for x in selector_slice]
+        self.tables = []
+        for x, y in slices:
+            if len(slices) == 1:
+                table = dict(keys)
+            else:
+                table = dict((k, r) for k, r in keys if len(k) == y - x)
+            self.tables.append((x, y, table))
+        self.select = self._select_function()
+
+    def _select_function(self):
+        if len(self.tables) == 1:
+            x, y, table = self.tables[0]
+            get = table.get
+            return lambda s: get(s[x:y])
+        tables = self.tables
+
+        def select(s):
+            for x, y, table in tables:
+                record = table.get(s[x:y])
+                if record is not None:
+                    return record
+            return None
+        return select
+
+    def encode(self, encoding):
+        return SelectorDispatcher(self.records, self.selector_slice, encoding)
+
+
+class QueryParsers(dict):
+    # the compile_query parsers of a load, by record. They are compiled
+    # before any line is read, so bad where values raise whatever the
+    # on_error policy
+
+    def __init__(self, records, fields=None, where=None, encoding=None,
+                 lazy=False):
+        known = set(f.name for r in records for f in r._record_options.fields)
+        unknown = (set(fields or ()) | set(where or ())) - known
+        if unknown:
+            raise ValueError('Unknown fields: %s' % ', '.join(sorted(unknown)))
+        self.records = records
+        self.fields = fields
+        self.where = where
+        self.encoding = encoding
+        self.lazy = lazy
+        for record in records:
+            self[record]
+
+    def __reduce__(self):
+        # the parsers are compiled again rather than pickled
+        return QueryParsers, (self.records, self.fields, self.where,
+                              self.encoding, self.lazy)
+
+    def __missing__(self, record):
+        parser = compile_query(record, self.fields, self.where, self.encoding,
+                               self.lazy)
+        self[record] = parser
+        return parser
+
+
 class FixedEngine(object):
 
     def __init__(self, records, selector=None, selector_slice=None,
-                    end_with_new_line=False):
+                    end_with_new_line=False, selector_prefix=False,
+                    lazy=False):
         self.records = records
         self.record_dict = {r.__name__: r for r in self.records}
         self.end_with_new_line = end_with_new_line
+        # loads give lazy records
+        self.lazy = lazy
+        self.dispatcher = None
+        # the LoadCounts of the last load started
+        self.counts = LoadCounts()
+        # a LoadStats while loads are instrumented
+        self.stats = None
+        # the Rejects of the last load started, None if it raises on errors
+        self.rejects = None
+        self.custom_selector = selector is not None
         if selector is not None:
             self.selector = selector
-        elif selector_slice is not None:
-            _x, _y = selector_slice
-            d = {r._record_options.selector_string: r for r in records}
-            self.selector = lambda s: d.get(s[_x:_y], None)
+        elif selector_slice is not None or selector_prefix:
+            self.dispatcher = SelectorDispatcher(records, selector_slice)
+            self.selector = self.dispatcher.select
         elif len(records) == 1:
             r = records[0]
             self.selector = lambda s: r
         else:
             raise AssertionError('No selector provided')
 
-    def save(self, path, objects, encoding='utf-8'):
-        lines = []
-        for obj in objects:
-            record = self.find_record(obj)
-            lines.append((record.to_string(obj)).encode(encoding))
-
-        with open(path, 'w') as f:
-            f.write('\n'.join(lines))
-            if self.end_with_new_line:
-                f.write('\n')
-
-    def load(self, path, encoding='utf-8'):
-        lines = codecs.open(path, 'r', encoding).readlines()
-        res = []
+    def save(self, path, objects, encoding='utf-8', buffer_size=CHUNK_SIZE,
+             compression='auto', threaded_io=False):
+        with self.writer(path, encoding, buffer_size, compression,
+                         threaded_io) as w:
+            for obj in objects:
+                w.write(obj)
+
+    def writer(self, path_or_fileobj, encoding='utf-8',
+               buffer_size=CHUNK_SIZE, compression='auto', threaded_io=False):
+        return FixedWriter(self, path_or_fileobj, encoding, buffer_size,
+                           compression, threaded_io)
+
+    def load(self, path, encoding='utf-8', workers=None, ordered=True,
+             bytes_mode=False, on_error='raise', rejects=None,
+             max_errors=None, fields=None, where=None, compression='auto',
+             threaded_io=False, counts=None):
+        return list(self.iter_load(path, encoding, workers, ordered,
+                                   bytes_mode, on_error, rejects, max_errors,
+                                   fields, where, compression, threaded_io,
+                                   counts))
+
+    def iter_load(self, path_or_fileobj, encoding='utf-8', workers=None,
+                  ordered=True, bytes_mode=False, on_error='raise',
+                  rejects=None, max_errors=None, fields=None, where=None,
+                  compression='auto', threaded_io=False, counts=None):
+        # bytes_mode slices the undecoded lines of single byte encodings.
+        # Unless on_error is 'raise', lines that fail to parse are skipped
+        # (and kept in self.rejects.rejected if it is 'collect'), written
+        # to the rejects path or stream and at most max_errors are allowed.
+        # rejects may also be a Rejects of the caller, which loads running
+        # at the same time should each have
+        # Only the lines whose raw slices match where (a dict of field name
+        # to value, set of values, Prefix or function of the slice) are
+        # parsed, and only their given fields are converted. gzip, bz2 and
+        # xz data is told by its magic bytes and decompressed on the fly,
+        # in a thread that overlaps with parsing if threaded_io. Unmatched
+        # and filtered lines are counted in counts (a LoadCounts, which
+        # loads running at the same time should each have) and self.counts
+        if bytes_mode:
+            check_single_byte(encoding)
+        rejects = self.reset_rejects(on_error, rejects, max_errors, encoding)
+        if counts is None:
+            counts = LoadCounts()
+        self.counts = counts
+        query = None
+        if fields is not None or where is not None:
+            query = QueryParsers(self.records, fields, where,
+                                 encoding if bytes_mode else None, self.lazy)
+        if workers > 1:
+            return iter_parallel(self, path_or_fileobj, encoding, workers,
+                                 ordered, bytes_mode=bytes_mode,
+                                 rejects=rejects, compression=compression,
+                                 threaded_io=threaded_io, query=query,
+                                 counts=counts)
+        lines = iter_lines(path_or_fileobj, encoding, decode=not bytes_mode,
+                           stats=self.stats, compression=compression,
+                           threaded_io=threaded_io)
+        objs = self.parse_lines(lines, encoding if bytes_mode else None,
+                                rejects, query=query, counts=counts)
+        if rejects is None:
+            return objs
+        return _closing(objs, rejects)
+
+    def reset_rejects(self, on_error='raise', rejects=None, max_errors=None,
+                      encoding='utf-8'):
+        # the Rejects of a load, kept in self.rejects too; loads that may
+        # overlap with others should be given their own Rejects
+        self.rejects = make_rejects(on_error, rejects, max_errors, encoding)
+        return self.rejects
+
+    def parse_lines(self, lines, encoding=None, rejects=None, first_line=1,
+                    query=None, counts=None):
+        # with an encoding the lines are bytes in that encoding; with
+        # rejects the lines that fail to parse are handed to it, numbered
+        # from first_line; query are the QueryParsers that replace those of
+        # the records. Unmatched and filtered lines are added to counts, or
+        # to a new self.counts
+        if encoding is None:
+            selector = self.selector
+        else:
+            selector = self.byte_selector(encoding)
+        stats = self.stats
+        lazy = self.lazy
+        if counts is None:
+            counts = self.counts = LoadCounts()
+        for number, line in enumerate(lines, first_line):
+            record = selector(line)
+            if not record:
+                counts.unmatched += 1
+                if stats is not None:
+                    stats.unmatched += 1
+                continue
+            if stats is not None:
+                stats.lines[record.__name__] += 1
+            try:
+                if query is not None:
+                    obj = query[record](record, line)
+                    if obj is None:
+                        counts.filtered += 1
+                        if stats is not None:
+                            stats.filtered += 1
+                        continue
+                elif lazy:
+                    obj = record.lazy_value(line if encoding is None
+                                            else line.decode(encoding))
+                elif stats is not None:
+                    obj = stats.parse(record, line, encoding)
+                elif encoding is None:
+                    obj = record.to_value(line)
+                else:
+                    obj = record.bytes_to_value(line, encoding)
+            except Exception, e:
+                if rejects is None:
+                    raise
+                rejects.reject(number, record, line, e, encoding)
+                continue
+            yield obj
+
+    @property
+    def unmatched(self):
+        # lines of the last load that matched no record
+        return self.counts.unmatched
+
+    @property
+    def filtered(self):
+        # lines left out by the where of the last load
+        return self.counts.filtered
+
+    def enable_stats(self):
+        # loads from now on count lines, time every field conversion and
+        # count their errors; set stats to None to go back to full speed.
+        # Loads with fields, where or lazy records only count lines, as
+        # their parsers don't convert field by field
+        self.stats = LoadStats()
+        return self.stats
+
+    def byte_selector(self, encoding):
+        # selector of lines kept as bytes; custom selectors are still given
+        # the decoded line
+        if self.dispatcher is not None:
+            return self.dispatcher.encode(encoding).select
+        if self.custom_selector:
+            selector = self.selector
+            return lambda line: selector(line.decode(encoding))
+        return self.selector
+
+    def group_lines(self, lines, selector=None):
+        selector = selector or self.selector
+        groups = {}
+        counts = self.counts = LoadCounts()
         for line in lines:
-            record = self.selector(line)
+            record = selector(line)
             if record:
-                res.append(record.to_value(line))
-        return res
+                try:
+                    groups[record].append(line)
+                except KeyError:
+                    groups[record] = [line]
+            else:
+                counts.unmatched += 1
+        return groups
+
+    def load_grouped(self, path_or_fileobj, encoding='utf-8'):
+        groups = self.group_lines(iter_lines(path_or_fileobj, encoding))
+        return dict((r, r.to_values(lines)) for r, lines in groups.items())
+
+    def load_columns(self, path, encoding='utf-8'):
+        # imported here, so numpy is only imported when columns are loaded
+        from pypfp.columnar import load_columns
+        return load_columns(self, path, encoding)
+
+    def mapped(self, path, encoding='utf-8', index_path=None,
+               line_length=None):
+        return MappedReader(self, path, encoding, index_path, line_length)
+
+    def push_parser(self, encoding='utf-8', bytes_mode=False,
+                    on_error='raise', rejects=None, max_errors=None):
+        return PushParser(self, encoding, bytes_mode, on_error, rejects,
+                          max_errors)
+
+    def resumable(self, path, checkpoint_path, encoding='utf-8',
+                  bytes_mode=False):
+        if bytes_mode:
+            check_single_byte(encoding)
+        return ResumableReader(self, path, checkpoint_path, encoding,
+                               bytes_mode)
+
+    def batch(self, inputs, workers=None, ordered=True, encoding='utf-8',
+              bytes_mode=False, on_error='raise', max_errors=None,
+              fields=None, where=None):
+        from pypfp.batch import Batch
+        return Batch(self, inputs, workers, ordered, encoding, bytes_mode,
+                     on_error, max_errors, fields, where)
 
     def find_record(self, obj):
         return self.record_dict[obj.__class__.__name__]
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+import csv
+import json
+import datetime
+import decimal
+from collections import OrderedDict
+
+from pypfp.converters import Int, Float, Decimal, DateTime
+from pypfp.streams import open_output
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover
+    pa = pq = None
+
+# rows per Parquet row group
+BATCH_ROWS = 64 * 1024
+
+
+def columns(records):
+    # field names of all the records, in order of appearance
+    names = []
+    for record in records:
+        for field in record._record_options.fields:
+            if field.name not in names:
+                names.append(field.name)
+    return names
+
+
+def _json_value(value):
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    return value
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    if isinstance(value, float):
+        # str keeps only 12 digits
+        return repr(value)
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    return value
+
+
+class RecordWriter(object):
+    # writes the records of an engine in another format to a path (which
+    # may be compressed, as told by its extension) or binary stream
+
+    def __init__(self, engine, path_or_fileobj, compression='auto'):
+        self.engine = engine
+        self.file = open_output(path_or_fileobj, compression)
+        self._owns_file = self.file is not path_or_fileobj
+        self.count = 0
+
+    def write(self, obj):
+        self.count += 1
+        self.write_record(self.engine.find_record(obj), obj)
+
+    def close(self):
+        if self._owns_file:
+            self.file.close()
+        elif hasattr(self.file, 'flush'):
+            self.file.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class JsonLinesWriter(RecordWriter):
+    # one utf-8 JSON object per line, with the record name under 'record'
+
+    def write_record(self, record, obj):
+        row = OrderedDict([('record', record.__name__)])
+        for field in record._record_options.fields:
+            row[field.name] = _json_value(getattr(obj, field.name))
+        line = json.dumps(row, ensure_ascii=False, separators=(',', ':'))
+        if isinstance(line, unicode):
+            line = line.encode('utf-8')
+        self.file.write(line + '\n')
+
+
+class CsvWriter(RecordWriter):
+    # a utf-8 CSV with a header; engines of several records get a 'record'
+    # column and the fields of all of them, empty where a record lacks one
+
+    def __init__(self, engine, path_or_fileobj, compression='auto'):
+        super(CsvWriter, self).__init__(engine, path_or_fileobj,
+                                        compression)
+        self.columns = columns(engine.records)
+        self._several = len(engine.records) > 1
+        self._writer = csv.writer(self.file, lineterminator='\n')
+        self._positions = dict((name, i)
+                               for i, name in enumerate(self.columns))
+        header = self.columns
+        if self._several:
+            header = ['record'] + header
+        self._writer.writerow(header)
+
+    def write_record(self, record, obj):
+        row = [''] * len(self.columns)
+        for field in record._record_options.fields:
+            row[self._positions[field.name]] = _csv_value(
+                getattr(obj, field.name))
+        if self._several:
+            row.insert(0, record.__name__)
+        self._writer.writerow(row)
+
+
+def _arrow_type(converter):
+    if isinstance(converter, Int):
+        return pa.int64()
+    if isinstance(converter, Decimal):
+        return pa.decimal128(38, converter.precision or 0)
+    if isinstance(converter, Float):
+        return pa.float64()
+    if isinstance(converter, DateTime):
+        return pa.timestamp('us')
+    return pa.string()
+
+
+class ParquetWriter(RecordWriter):
+    # a Parquet file with a row group every batch_size records, typed by
+    # the converters of the fields; as for CSV engines of several records
+    # get a 'record' column. compression is the Parquet codec, if given
+
+    def __init__(self, engine, path_or_fileobj, compression='auto',
+                 batch_size=BATCH_ROWS):
+        if pa is None:
+            raise ImportError('pyarrow is required to write Parquet')
+        self.engine = engine
+        self.count = 0
+        self.batch_size = batch_size
+        types = OrderedDict()
+        if len(engine.records) > 1:
+            types['record'] = pa.string()
+        for record in engine.records:
+            for field in record._record_options.fields:
+                types.setdefault(field.name, _arrow_type(field.converter))
+        self.schema = pa.schema([pa.field(n, t) for n, t in types.items()])
+        self._columns = OrderedDict((name, []) for name in types)
+        kwargs = {} if compression in ('auto', None) else \
+            {'compression': compression}
+        self._writer = pq.ParquetWriter(path_or_fileobj, self.schema,
+                                        **kwargs)
+
+    def write_record(self, record, obj):
+        fields = record._record_options.fields
+        names = set(f.name for f in fields)
+        for name, column in self._columns.items():
+            if name == 'record' and 'record' not in names:
+                column.append(record.__name__)
+            elif name in names:
+                column.append(getattr(obj, name))
+            else:
+                column.append(None)
+        if len(self._columns.values()[0]) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._columns.values()[0]:
+            return
+        arrays = [pa.array(values, type=field.type)
+                  for values, field in zip(self._columns.values(),
+                                           self.schema)]
+        self._writer.write_table(pa.Table.from_arrays(
+            arrays, schema=self.schema))
+        for column in self._columns.values():
+            del column[:]
+
+    def close(self):
+        self.flush()
+        self._writer.close()
+
+
+WRITERS = {'csv': CsvWriter, 'jsonl': JsonLinesWriter,
+           'parquet': ParquetWriter}
+
+
+def record_writer(format, engine, path_or_fileobj, compression='auto'):
+    if format not in WRITERS:
+        raise ValueError('Unknown format: %s' % format)
+    return WRITERS[format](engine, path_or_fileobj, compression)
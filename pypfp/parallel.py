@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+import os
+import multiprocessing
+from collections import deque
+from Queue import Queue
+from itertools import islice
+
+from pypfp.stats import LoadStats, LoadCounts
+from pypfp.rejects import Rejects
+from pypfp.streams import file_compression
+
+CHUNK_BYTES = 4 * 1024 * 1024
+BATCH_LINES = 20000
+
+_worker = {}
+
+
+def _init_worker(engine, encoding, bytes_mode, tolerant, query):
+    # the pool forks after the engine is set, so selectors and record
+    # classes don't need to be pickled; only the parsed records are
+    _worker['engine'] = engine
+    _worker['query'] = query
+    _worker['encoding'] = encoding
+    _worker['bytes_mode'] = bytes_mode
+    _worker['tolerant'] = tolerant
+
+
+def _parse(lines, bytes_read=0):
+    # stats and rejected lines are collected per task and handed over to
+    # the parent, which merges them
+    engine = _worker['engine']
+    if engine.stats is not None:
+        engine.stats = LoadStats()
+        engine.stats.bytes_read = bytes_read
+    rejects = Rejects('collect') if _worker['tolerant'] else None
+    encoding = _worker['encoding'] if _worker['bytes_mode'] else None
+    counts = LoadCounts()
+    objs = list(engine.parse_lines(lines, encoding, rejects,
+                                   query=_worker['query'], counts=counts))
+    return (objs, counts.unmatched, counts.filtered, engine.stats,
+            len(lines), rejects.rejected if rejects else None)
+
+
+def _parse_range(task):
+    path, start, end = task
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    if not _worker['bytes_mode']:
+        data = data.decode(_worker['encoding'])
+    return _parse(data.splitlines(True), end - start)
+
+
+def _run(task):
+    index, (func, arg) = task
+    try:
+        return index, True, func(arg)
+    except Exception, e:
+        return index, False, e
+
+
+def byte_ranges(path, chunk_size=CHUNK_BYTES):
+    size = os.path.getsize(path)
+    start = 0
+    with open(path, 'rb') as f:
+        while start < size:
+            f.seek(start + chunk_size)
+            f.readline()
+            end = min(f.tell(), size)
+            yield start, end
+            start = end
+
+
+def _splittable(path_or_fileobj, compression):
+    # compressed files can't be split, they are read as streams
+    if not isinstance(path_or_fileobj, basestring):
+        return False
+    if compression == 'auto':
+        return file_compression(path_or_fileobj) is None
+    return not compression
+
+
+def _tasks(path_or_fileobj, encoding, chunk_size, bytes_mode, stats,
+           compression='auto', threaded_io=False):
+    if _splittable(path_or_fileobj, compression):
+        for start, end in byte_ranges(path_or_fileobj, chunk_size):
+            yield _parse_range, (path_or_fileobj, start, end)
+    else:
+        from pypfp.core import iter_lines
+        lines = iter_lines(path_or_fileobj, encoding, decode=not bytes_mode,
+                           stats=stats, compression=compression,
+                           threaded_io=threaded_io)
+        while True:
+            batch = list(islice(lines, BATCH_LINES))
+            if not batch:
+                break
+            yield _parse, batch
+
+
+def _results(pool, tasks, workers, ordered):
+    # at most two tasks per worker are in flight, so streams are read (and
+    # records kept) only as fast as they are consumed
+    max_pending = 2 * workers
+    if ordered:
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.apply_async(_run, (task,)))
+            if len(pending) >= max_pending:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+    else:
+        done = Queue()
+        pending = 0
+        for task in tasks:
+            pool.apply_async(_run, (task,), callback=done.put)
+            pending += 1
+            if pending >= max_pending:
+                pending -= 1
+                yield done.get()
+        for _ in xrange(pending):
+            yield done.get()
+
+
+class _Renumber(object):
+    # tasks number their rejected lines from 1; they are numbered within
+    # the file (and handed to rejects, in order) once the line counts of
+    # all the previous tasks are known
+
+    def __init__(self, rejects):
+        self.rejects = rejects
+        self.done = {}
+        self.next = 0
+        self.offset = 0
+
+    def add(self, index, lines, rejected):
+        self.done[index] = (lines, rejected)
+        while self.next in self.done:
+            lines, rejected = self.done.pop(self.next)
+            for r in rejected:
+                self.rejects.add(r._replace(
+                                    line_number=r.line_number + self.offset))
+            self.offset += lines
+            self.next += 1
+
+
+def iter_parallel(engine, path_or_fileobj, encoding='utf-8', workers=2,
+                  ordered=True, chunk_size=CHUNK_BYTES, bytes_mode=False,
+                  rejects=None, compression='auto', threaded_io=False,
+                  query=None, counts=None):
+    # query are the QueryParsers of the load, if any; unmatched and
+    # filtered lines are added to counts, or to a new engine.counts
+    pool = multiprocessing.Pool(workers, _init_worker,
+                                (engine, encoding, bytes_mode,
+                                 rejects is not None, query))
+    if counts is None:
+        counts = engine.counts = LoadCounts()
+    renumber = _Renumber(rejects)
+    try:
+        tasks = enumerate(_tasks(path_or_fileobj, encoding, chunk_size,
+                                 bytes_mode, engine.stats, compression,
+                                 threaded_io))
+        for index, ok, res in _results(pool, tasks, workers, ordered):
+            if not ok:
+                raise res
+            objs, unmatched, filtered, stats, lines, rejected = res
+            counts.unmatched += unmatched
+            counts.filtered += filtered
+            if stats is not None:
+                engine.stats.merge(stats)
+            if rejected is not None:
+                renumber.add(index, lines, rejected)
+            for obj in objs:
+                yield obj
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+        if rejects is not None:
+            rejects.close()
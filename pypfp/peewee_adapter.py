@@ -1,8 +1,9 @@
 # -*- coding: utf-8 -*-
 
 import peewee
-from pypfp.core import RecordMetaClass, Record
+from pypfp.core import RecordMetaClass, Record, iter_lines, CHUNK_SIZE
 from pypfp.converters import Int, DateTime, String, Float, BigInt, Decimal
+from pypfp.stats import LoadCounts
 
 
 class PeeweeRecordMetaClass(peewee.BaseModel, RecordMetaClass):
@@ -10,6 +11,8 @@ class PeeweeRecordMetaClass(peewee.BaseModel, RecordMetaClass):
     def __new__(cls, name, bases, attrs):
         cls.init_class(attrs, cls.get_db_field)
         _r = attrs['_record_options']
+        if _r.compact:
+            raise AssertionError('Peewee records can not be compact')
         res = super(PeeweeRecordMetaClass, cls).__new__(cls, name,
                                                             bases, attrs)
         res._record_options = _r
@@ -43,5 +46,97 @@ class PeeweeRecordMetaClass(peewee.BaseModel, RecordMetaClass):
 class PeeweeRecord(peewee.Model, Record):
     __metaclass__ = PeeweeRecordMetaClass
 
+    @classmethod
+    def iter_strings(cls, query=None):
+        # lines for the rows of query (all rows by default), selecting only
+        # the record fields as tuples so no model instance is created
+        if query is None:
+            query = cls.select()
+        fields = [cls._meta.fields[f.name] for f in cls._record_options.fields]
+        to_string = cls._record_options.tuple_serializer
+        for row in query.select(*fields).tuples().iterator():
+            yield to_string(row)
 
 
+# fields whose db_value leaves the values of the converters untouched
+_NATIVE_FIELDS = (peewee.IntegerField, peewee.BigIntegerField,
+                  peewee.FloatField, peewee.CharField)
+
+
+def _row_inserter(model):
+    # sql and line -> row function writing the record fields, plus the
+    # model fields with a default, without creating model instances
+    meta = model._meta
+    names = [f.name for f in model._record_options.fields]
+    extra = [f for f in meta.get_fields() if f.name not in names and
+             f.default is not None]
+    columns = [meta.fields[name] for name in names] + extra
+    to_tuple = model._record_options.row_parser
+    conversions = [(i, f.db_value) for i, f in enumerate(columns)
+                   if type(f) not in _NATIVE_FIELDS]
+    defaults = [f.default for f in extra]
+    if conversions or defaults:
+        def to_row(line):
+            row = list(to_tuple(line))
+            for default in defaults:
+                row.append(default() if callable(default) else default)
+            for i, db_value in conversions:
+                row[i] = db_value(row[i])
+            return row
+    else:
+        to_row = to_tuple
+    db = meta.database
+    quote = lambda s: db.quote_char + s + db.quote_char
+    sql = 'INSERT INTO %s (%s) VALUES (%s)' % (
+        quote(meta.db_table), ', '.join(quote(f.db_column) for f in columns),
+        ', '.join([db.interpolation] * len(columns)))
+    return sql, to_row
+
+
+def _insert(model, sql, rows):
+    db = model._meta.database
+    with db.atomic():
+        db.get_cursor().executemany(sql, rows)
+
+
+def load_into_db(engine, path_or_fileobj, batch_size=500, encoding='utf-8'):
+    inserters = dict((r, _row_inserter(r)) for r in engine.records)
+    selector = engine.selector
+    counts = {}
+    batches = {}
+    load_counts = engine.counts = LoadCounts()
+    for line in iter_lines(path_or_fileobj, encoding):
+        model = selector(line)
+        if model is None:
+            load_counts.unmatched += 1
+            continue
+        sql, to_row = inserters[model]
+        rows = batches.setdefault(model, [])
+        rows.append(to_row(line))
+        if len(rows) >= batch_size:
+            _insert(model, sql, rows)
+            counts[model] = counts.get(model, 0) + len(rows)
+            batches[model] = []
+    for model, rows in batches.items():
+        if rows:
+            _insert(model, inserters[model][0], rows)
+            counts[model] = counts.get(model, 0) + len(rows)
+    return dict((m._meta.db_table, c) for m, c in counts.items())
+
+
+def export_to_file(engine, path_or_fileobj, sources, encoding='utf-8',
+                   buffer_size=CHUNK_SIZE):
+    # sources are models or (model, query) pairs written in the given order,
+    # e.g. a generator interleaving each header with its detail records
+    counts = {}
+    with engine.writer(path_or_fileobj, encoding, buffer_size) as w:
+        for source in sources:
+            if isinstance(source, tuple):
+                model, query = source
+            else:
+                model, query = source, None
+            table = model._meta.db_table
+            for line in model.iter_strings(query):
+                w.write_line(line)
+                counts[table] = counts.get(table, 0) + 1
+    return counts
@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+import os
+import mmap
+import zlib
+from array import array
+from collections import namedtuple
+
+from pypfp.rejects import make_rejects
+from pypfp.stats import LoadCounts
+from pypfp.streams import file_compression
+
+INDEX_HEADER = 'pypfp-index'
+CHECKPOINT_HEADER = 'pypfp-checkpoint'
+CHUNK_SIZE = 64 * 1024
+# bytes at the start of the file checked to tell it is the same file
+IDENTITY_BYTES = 4096
+
+
+def _check_uncompressed(path):
+    # offsets are those of the file, not of the decompressed data
+    compression = file_compression(path)
+    if compression:
+        raise ValueError('%s is compressed with %s' % (path, compression))
+
+
+def _replace(path, data):
+    # written aside and renamed, so a crash never leaves half a file
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    if os.name == 'nt' and os.path.exists(path):
+        os.remove(path)  # pragma: no cover
+    os.rename(tmp, path)
+
+
+class MappedReader(object):
+
+    def __init__(self, engine, path, encoding='utf-8', index_path=None,
+                 line_length=None):
+        self.engine = engine
+        self.path = path
+        self.encoding = encoding
+        self.index_path = index_path
+        _check_uncompressed(path)
+        self._file = open(path, 'rb')
+        self._size = os.fstat(self._file.fileno()).st_size
+        if self._size:
+            self._map = mmap.mmap(self._file.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+        else:
+            self._map = ''
+        self.line_length = line_length or self._constant_length()
+        self._offsets = None
+        if self.line_length:
+            self._count = -(-self._size // self.line_length)
+        else:
+            self._offsets = self._load_index() or self._build_index()
+            self._count = len(self._offsets) - 1
+
+    def _constant_length(self):
+        # lines are taken as constant length when every expected new line
+        # position holds one and there are no other new lines (a shorter
+        # last line may lack it)
+        m = self._map
+        length = m.find('\n') + 1
+        if not length:
+            return None
+        expected = self._size // length
+        if m[length - 1::length] != '\n' * expected:
+            return None
+        found = 0
+        for start in xrange(0, self._size, CHUNK_SIZE):
+            found += m[start:start + CHUNK_SIZE].count('\n')
+        if found != expected:
+            return None
+        return length
+
+    def _build_index(self):
+        m = self._map
+        offsets = array('L', [0])
+        pos = m.find('\n')
+        while pos != -1:
+            offsets.append(pos + 1)
+            pos = m.find('\n', pos + 1)
+        if offsets[-1] != self._size:
+            offsets.append(self._size)
+        if self.index_path:
+            _replace(self.index_path, self._index_header(len(offsets)) +
+                     offsets.tostring())
+        return offsets
+
+    def _index_header(self, count):
+        st = os.stat(self.path)
+        return '%s %d %r %d %d\n' % (INDEX_HEADER, st.st_size, st.st_mtime,
+                                     count, array('L').itemsize)
+
+    def _load_index(self):
+        if not self.index_path or not os.path.exists(self.index_path):
+            return None
+        with open(self.index_path, 'rb') as f:
+            header = f.readline()
+            parts = header.split()
+            try:
+                if len(parts) != 5 or header != self._index_header(
+                                                            int(parts[3])):
+                    return None
+                offsets = array('L')
+                offsets.fromfile(f, int(parts[3]))
+            except (EOFError, ValueError):
+                # a short or garbled index is built again
+                return None
+        return offsets
+
+    def line(self, i):
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError('Line index out of range')
+        if self.line_length:
+            start = i * self.line_length
+            end = start + self.line_length
+        else:
+            start, end = self._offsets[i], self._offsets[i + 1]
+        return self._map[start:end].decode(self.encoding)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in xrange(*i.indices(self._count))]
+        line = self.line(i)
+        record = self.engine.selector(line)
+        if not record:
+            return None
+        if self.engine.lazy:
+            return record.lazy_value(line)
+        return record.to_value(line)
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        for i in xrange(self._count):
+            yield self[i]
+
+    def close(self):
+        if self._size:
+            self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+Checkpoint = namedtuple('Checkpoint', 'offset line_number device inode crc')
+
+
+def _head_crc(f, offset):
+    # leaves the file where it was, it may be in the middle of a read
+    position = f.tell()
+    f.seek(0)
+    crc = zlib.crc32(f.read(min(offset, IDENTITY_BYTES))) & 0xffffffff
+    f.seek(position)
+    return crc
+
+
+class ResumableReader(object):
+    # parses a file that keeps growing from where the last run left it.
+    # The checkpoint holds the offset and number of the lines already
+    # processed plus the identity of the file; a replaced or truncated
+    # file is read again from the start. Lines without their new line yet
+    # are left for the next run
+
+    def __init__(self, engine, path, checkpoint_path, encoding='utf-8',
+                 bytes_mode=False):
+        self.engine = engine
+        self.path = path
+        self.checkpoint_path = checkpoint_path
+        self.encoding = encoding
+        self.bytes_mode = bytes_mode
+        # lines are split as bytes, before decoding
+        if u'\n'.encode(encoding) != '\n':
+            raise ValueError('New lines are not single bytes in %s'
+                             % encoding)
+        self.offset = 0
+        self.line_number = 0
+        self._committed = 0
+        # the Rejects and LoadCounts of the last iter_load
+        self.rejects = None
+        self.counts = LoadCounts()
+        _check_uncompressed(path)
+        self._file = open(path, 'rb')
+        checkpoint = self.load_checkpoint()
+        if checkpoint is not None:
+            self.offset = checkpoint.offset
+            self.line_number = self._committed = checkpoint.line_number
+
+    def _checkpoint(self):
+        st = os.fstat(self._file.fileno())
+        return Checkpoint(self.offset, self.line_number, st.st_dev,
+                          st.st_ino, _head_crc(self._file, self.offset))
+
+    def load_checkpoint(self):
+        if not os.path.exists(self.checkpoint_path):
+            return None
+        with open(self.checkpoint_path, 'rb') as f:
+            parts = f.read().split()
+        if len(parts) != 6 or parts[0] != CHECKPOINT_HEADER:
+            return None
+        checkpoint = Checkpoint(*[int(x) for x in parts[1:]])
+        st = os.fstat(self._file.fileno())
+        if ((checkpoint.device, checkpoint.inode) != (st.st_dev, st.st_ino)
+                or checkpoint.offset > st.st_size or checkpoint.crc !=
+                _head_crc(self._file, checkpoint.offset)):
+            return None
+        return checkpoint
+
+    def commit(self):
+        _replace(self.checkpoint_path, '%s %d %d %d %d %d\n' % (
+            (CHECKPOINT_HEADER,) + self._checkpoint()))
+        self._committed = self.line_number
+
+    def _raw_lines(self, final):
+        self._file.seek(self.offset)
+        pending = ''
+        for chunk in iter(lambda: self._file.read(CHUNK_SIZE), ''):
+            lines = (pending + chunk).splitlines(True)
+            # the last line may be incomplete (or a '\r' waiting for its
+            # '\n')
+            pending = lines.pop() if lines else ''
+            for line in lines:
+                yield line
+        if pending.endswith('\n') or (pending and final):
+            yield pending
+
+    def _lines(self, final, commit_every):
+        offset, number = self.offset, self.line_number
+        decode = not self.bytes_mode
+        for line in self._raw_lines(final):
+            # a new line is asked for once the previous one is processed
+            self.offset, self.line_number = offset, number
+            if commit_every and number - self._committed >= commit_every:
+                self.commit()
+            offset += len(line)
+            number += 1
+            yield line.decode(self.encoding) if decode else line
+        self.offset, self.line_number = offset, number
+
+    def iter_load(self, final=False, commit_every=None, on_error='raise',
+                  rejects=None, max_errors=None):
+        # the records of the new complete lines (and of a last line without
+        # its new line if final). With commit_every the checkpoint is
+        # committed every that many lines and when the lines run out
+        engine = self.engine
+        self.rejects = rejects = make_rejects(on_error, rejects, max_errors,
+                                              self.encoding)
+        self.counts = LoadCounts()
+        objs = engine.parse_lines(self._lines(final, commit_every),
+                                  self.encoding if self.bytes_mode else None,
+                                  rejects, self.line_number + 1,
+                                  counts=self.counts)
+        try:
+            for obj in objs:
+                yield obj
+            if commit_every:
+                self.commit()
+        finally:
+            if rejects is not None:
+                rejects.close()
+
+    def __iter__(self):
+        return self.iter_load()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
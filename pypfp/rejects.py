@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+import io
+from collections import namedtuple
+
+ON_ERROR = ('raise', 'skip', 'collect')
+
+Rejected = namedtuple('Rejected', 'line_number record field reason line')
+
+
+def failing_field(record, line, error):
+    # converts the fields one by one to tell which one rejects the line
+    for field in record._record_options.fields:
+        try:
+            value = field.converter.to_value(
+                line[field.start:field.start + field.width])
+            if field.validator:
+                field.validator(value)
+        except Exception, e:
+            return field.name, e
+    return None, error
+
+
+def reason(error):
+    try:
+        message = unicode(error)
+    except UnicodeError:
+        message = str(error).decode('latin-1')
+    message = u' '.join(message.split())
+    return u'%s: %s' % (type(error).__name__, message)
+
+
+class Rejects(object):
+    # lines that failed to parse, by on_error policy: 'skip' only counts
+    # them, 'collect' keeps them in `rejected`. Either way they are written
+    # to the stream, if any, as tab separated line number, record, field,
+    # reason and the raw line. A path is only opened once there is
+    # something to write, or on close
+
+    def __init__(self, on_error='skip', path_or_fileobj=None,
+                 max_errors=None, encoding='utf-8'):
+        assert on_error in ON_ERROR[1:]
+        self.on_error = on_error
+        self.max_errors = max_errors
+        self.encoding = encoding
+        self.count = 0
+        self.rejected = []
+        self._owns_file = isinstance(path_or_fileobj, basestring)
+        if self._owns_file:
+            self.path = path_or_fileobj
+            self.file = None
+        else:
+            self.path = None
+            self.file = path_or_fileobj
+        self._text = isinstance(self.file, io.TextIOBase)
+        self.closed = False
+
+    def _open(self):
+        if self.file is None and self.path is not None:
+            self.file = open(self.path, 'wb')
+
+    def reject(self, line_number, record, line, error, encoding=None):
+        # encoding is the one of byte lines
+        text = line.decode(encoding) if encoding is not None else line
+        field, error = failing_field(record, text, error)
+        self.add(Rejected(line_number, record.__name__, field, reason(error),
+                          line))
+
+    def add(self, rejected):
+        self.count += 1
+        if self.on_error == 'collect':
+            self.rejected.append(rejected)
+        if self.path is not None or self.file is not None:
+            self._open()
+            self._write(rejected)
+        if self.max_errors is not None and self.count > self.max_errors:
+            raise ValueError('More than %d rejected lines' % self.max_errors)
+
+    def _write(self, rejected):
+        line = rejected.line
+        if self._text and isinstance(line, str):
+            line = line.decode(self.encoding)
+        elif not self._text and isinstance(line, unicode):
+            line = line.encode(self.encoding)
+        prefix = u'%d\t%s\t%s\t%s\t' % (rejected.line_number, rejected.record,
+                                        rejected.field or u'', rejected.reason)
+        if not self._text:
+            prefix = prefix.encode(self.encoding)
+        new_line = u'\n' if self._text else '\n'
+        self.file.write(prefix + line.rstrip(new_line + '\r') + new_line)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        if self._owns_file:
+            # an empty file tells there were no rejects
+            self._open()
+            self.file.close()
+        elif self.file is not None:
+            self.file.flush()
+
+
+def make_rejects(on_error='raise', rejects=None, max_errors=None,
+                 encoding='utf-8'):
+    # the Rejects of a load: rejects itself if it is one, so callers keep
+    # theirs, otherwise one for on_error writing to the rejects path or
+    # stream, or None if on_error is 'raise'
+    if isinstance(rejects, Rejects):
+        return rejects
+    assert on_error in ON_ERROR
+    if on_error == 'raise':
+        return None
+    return Rejects(on_error, rejects, max_errors, encoding)
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+from collections import defaultdict
+from timeit import default_timer
+
+
+class LoadCounts(object):
+    # lines of one load that matched no record, and that its where left out
+
+    def __init__(self):
+        self.unmatched = 0
+        self.filtered = 0
+
+
+class LoadStats(object):
+    # counters of the loads of an engine, keyed by record class name and
+    # (record class name, field name) so they can be pickled and exported
+
+    def __init__(self):
+        self.bytes_read = 0
+        self.unmatched = 0
+        # lines left out by where, also counted in lines
+        self.filtered = 0
+        self.lines = defaultdict(int)
+        self.field_time = defaultdict(float)
+        self.field_errors = defaultdict(int)
+
+    def parse(self, record, line, encoding=None):
+        # the generic per field path, timing every conversion; a lot slower
+        # than the compiled parsers but it tells where the time goes
+        if encoding is not None:
+            line = line.decode(encoding)
+        name = record.__name__
+        obj = record()
+        for field in record._record_options.fields:
+            key = (name, field.name)
+            start = default_timer()
+            try:
+                field.to_value(line[field.start:field.start + field.width],
+                               obj)
+            except Exception:
+                self.field_errors[key] += 1
+                raise
+            finally:
+                self.field_time[key] += default_timer() - start
+        return obj
+
+    def merge(self, other):
+        self.bytes_read += other.bytes_read
+        self.unmatched += other.unmatched
+        self.filtered += other.filtered
+        for mine, theirs in ((self.lines, other.lines),
+                             (self.field_time, other.field_time),
+                             (self.field_errors, other.field_errors)):
+            for key, value in theirs.items():
+                mine[key] += value
+
+    def as_dict(self):
+        records = {}
+        for name, lines in self.lines.items():
+            records[name] = {'lines': lines, 'fields': {}}
+        for key in set(self.field_time) | set(self.field_errors):
+            name, field = key
+            record = records.setdefault(name, {'lines': 0, 'fields': {}})
+            record['fields'][field] = {
+                'seconds': self.field_time.get(key, 0.0),
+                'errors': self.field_errors.get(key, 0)}
+        return {'bytes_read': self.bytes_read, 'unmatched': self.unmatched,
+                'filtered': self.filtered, 'records': records}
+
+    def report(self):
+        # one line per field, the slowest first
+        rows = ['%-20s %-20s %10s %10s %8s' % ('record', 'field', 'lines',
+                                               'seconds', 'errors')]
+        keys = sorted(set(self.field_time) | set(self.field_errors),
+                      key=lambda k: -self.field_time.get(k, 0.0))
+        for key in keys:
+            rows.append('%-20s %-20s %10d %10.4f %8d' % (
+                key + (self.lines.get(key[0], 0),
+                       self.field_time.get(key, 0.0),
+                       self.field_errors.get(key, 0))))
+        rows.append('bytes read: %d, unmatched lines: %d, filtered lines: %d'
+                    % (self.bytes_read, self.unmatched, self.filtered))
+        return '\n'.join(rows)
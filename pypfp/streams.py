@@ -0,0 +1,324 @@
+# -*- coding: utf-8 -*-
+import os
+import re
+import bz2
+import zlib
+import threading
+from itertools import chain
+from Queue import Queue, Empty
+
+try:
+    import lzma
+except ImportError:  # pragma: no cover
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
+
+CHUNK_SIZE = 64 * 1024
+# chunks read or written ahead by the threads
+QUEUE_SIZE = 8
+
+# headers long enough that plain text doesn't start with them: the gzip
+# magic and deflate method, and the bzip2 magic, block size and the magic
+# of its first block (or of the end of an empty stream)
+MAGIC = ((re.compile('\x1f\x8b\x08'), 'gzip'),
+         (re.compile('BZh[1-9](1AY&SY|\x17rE8P\x90)'), 'bz2'),
+         (re.compile('\xfd7zXZ\x00'), 'xz'))
+# bytes needed to tell them
+HEAD_SIZE = 10
+EXTENSIONS = {'.gz': 'gzip', '.bz2': 'bz2', '.xz': 'xz'}
+
+
+def _check(compression):
+    if compression not in ('gzip', 'bz2', 'xz'):
+        raise ValueError('Unknown compression: %s' % compression)
+    if compression == 'xz' and lzma is None:
+        raise ImportError('lzma (or backports.lzma) is required for xz')
+
+
+def detect(head):
+    # compression of data starting with head, None if it isn't compressed
+    # (text streams never are)
+    if not isinstance(head, str):
+        return None
+    for magic, compression in MAGIC:
+        if magic.match(head):
+            return compression
+    return None
+
+
+def from_extension(path):
+    for extension, compression in EXTENSIONS.items():
+        if path.lower().endswith(extension):
+            return compression
+    return None
+
+
+def file_compression(path):
+    with open(path, 'rb') as f:
+        return detect(f.read(HEAD_SIZE))
+
+
+def _decompressor(compression):
+    _check(compression)
+    if compression == 'gzip':
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if compression == 'bz2':
+        return bz2.BZ2Decompressor()
+    return lzma.LZMADecompressor()
+
+
+def _compressor(compression, level=None):
+    _check(compression)
+    if compression == 'gzip':
+        return zlib.compressobj(6 if level is None else level, zlib.DEFLATED,
+                                16 + zlib.MAX_WBITS)
+    if compression == 'bz2':
+        return bz2.BZ2Compressor(9 if level is None else level)
+    if level is None:
+        return lzma.LZMACompressor()
+    return lzma.LZMACompressor(preset=level)
+
+
+def decompress(chunks, compression):
+    # streams of several members (as written by pigz, pbzip2 or cat) are
+    # read through
+    decompressor = _decompressor(compression)
+    for chunk in chunks:
+        while chunk:
+            try:
+                data = decompressor.decompress(chunk)
+            except EOFError:
+                # bz2 and xz refuse data once a member ended
+                decompressor = _decompressor(compression)
+                continue
+            if data:
+                yield data
+            chunk = decompressor.unused_data
+            if chunk:
+                decompressor = _decompressor(compression)
+    if compression == 'gzip':
+        data = decompressor.flush()
+        if data:
+            yield data
+
+
+def threaded(iterable, queue_size=QUEUE_SIZE):
+    # iterates in a thread, so reading and decompressing (which release the
+    # GIL) overlap with the work done on the items
+    queue = Queue(queue_size)
+    stop = threading.Event()
+    end = object()
+
+    def produce():
+        try:
+            for item in iterable:
+                if stop.is_set():
+                    break
+                queue.put((True, item))
+        except Exception, e:
+            queue.put((False, e))
+        finally:
+            if hasattr(iterable, 'close'):
+                iterable.close()
+        if not stop.is_set():
+            queue.put((True, end))
+
+    thread = threading.Thread(target=produce)
+    thread.daemon = True
+    thread.start()
+    try:
+        while True:
+            ok, item = queue.get()
+            if not ok:
+                raise item
+            if item is end:
+                break
+            yield item
+    finally:
+        stop.set()
+        while thread.is_alive():
+            try:
+                queue.get(timeout=0.1)
+            except Empty:
+                pass
+
+
+def _file_chunks(path, chunk_size):
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), ''):
+            yield chunk
+
+
+def _fd_read(fileobj):
+    # reads of the descriptor of a builtin file (which lacks read1), or
+    # None. Seekable files first skip to where the file object is, past
+    # what it buffered
+    if not isinstance(fileobj, file):
+        return None
+    fd = fileobj.fileno()
+    try:
+        os.lseek(fd, fileobj.tell(), os.SEEK_SET)
+    except (IOError, OSError):
+        pass
+    return lambda size: os.read(fd, size)
+
+
+def _stream_reads(fileobj):
+    # partial reads, which hand over whatever has arrived so pipes and
+    # sockets are parsed while bytes keep arriving (readline if the stream
+    # has none), and whole reads
+    fd_read = _fd_read(fileobj)
+    if fd_read is not None:
+        return fd_read, fd_read
+    return (getattr(fileobj, 'read1', fileobj.readline),
+            lambda size: fileobj.read(size))
+
+
+def read_chunks(path_or_fileobj, chunk_size=CHUNK_SIZE, compression='auto',
+                threaded_io=False):
+    # chunks of the data of a path or file object, decompressed if it is
+    # (by its magic bytes when compression is 'auto'), read and
+    # decompressed in a thread with threaded_io
+    if isinstance(path_or_fileobj, basestring):
+        chunks = _file_chunks(path_or_fileobj, chunk_size)
+    else:
+        partial_read, read = _stream_reads(path_or_fileobj)
+        chunks = iter(lambda: partial_read(chunk_size), '')
+    head = ''
+    if compression == 'auto':
+        head = next(chunks, '')
+        while 0 < len(head) < HEAD_SIZE:
+            more = next(chunks, '')
+            if not more:
+                break
+            head += more
+        compression = detect(head)
+    if compression and not isinstance(path_or_fileobj, basestring):
+        # compressed data has no lines worth waiting for, so the rest is
+        # read in whole chunks
+        chunks = iter(lambda: read(chunk_size), '')
+    if head:
+        chunks = chain([head], chunks)
+    if compression:
+        chunks = decompress(chunks, compression)
+    if threaded_io:
+        chunks = threaded(chunks)
+    return chunks
+
+
+class CompressedWriter(object):
+    # file like object compressing what is written to fileobj
+
+    def __init__(self, fileobj, compression, owns_file=False, level=None):
+        self.file = fileobj
+        self.compression = compression
+        self._compressor = _compressor(compression, level)
+        self._owns_file = owns_file
+        self.closed = False
+
+    def write(self, data):
+        data = self._compressor.compress(data)
+        if data:
+            self.file.write(data)
+
+    def flush(self):
+        # only hands over what is already compressed; a full flush would end
+        # bz2 and xz streams and worsen gzip compression
+        if hasattr(self.file, 'flush'):
+            self.file.flush()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.file.write(self._compressor.flush())
+        if self._owns_file:
+            self.file.close()
+        elif hasattr(self.file, 'flush'):
+            self.file.flush()
+
+
+# marks the flushes in the queue of a ThreadedWriter
+_FLUSH = object()
+
+
+class ThreadedWriter(object):
+    # writes (and compresses) in a thread, so it overlaps with serializing.
+    # Errors of the thread are raised by the next write or by close
+
+    def __init__(self, fileobj, owns_file=False, queue_size=QUEUE_SIZE):
+        self.file = fileobj
+        self._owns_file = owns_file
+        self._queue = Queue(queue_size)
+        self._error = None
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+        self.closed = False
+
+    def _run(self):
+        while True:
+            data = self._queue.get()
+            if data is None:
+                break
+            if self._error is None:
+                try:
+                    if data is _FLUSH:
+                        if hasattr(self.file, 'flush'):
+                            self.file.flush()
+                    else:
+                        self.file.write(data)
+                except Exception, e:
+                    self._error = e
+
+    def _raise(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def write(self, data):
+        self._raise()
+        self._queue.put(data)
+
+    def flush(self):
+        # queued, so it doesn't wait for the pending writes
+        self._raise()
+        self._queue.put(_FLUSH)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self._queue.put(None)
+        self._thread.join()
+        try:
+            self._raise()
+        finally:
+            if self._owns_file:
+                self.file.close()
+            elif hasattr(self.file, 'flush'):
+                self.file.flush()
+
+
+def open_output(path_or_fileobj, compression='auto', threaded_io=False,
+                level=None):
+    # file object to write to, compressed as told by the extension of the
+    # path when compression is 'auto'. Closing it closes only the files it
+    # opened
+    if isinstance(path_or_fileobj, basestring):
+        if compression == 'auto':
+            compression = from_extension(path_or_fileobj)
+        if compression:
+            _check(compression)
+        f = open(path_or_fileobj, 'wb')
+        if compression:
+            f = CompressedWriter(f, compression, True, level)
+    else:
+        f = path_or_fileobj
+        if compression and compression != 'auto':
+            f = CompressedWriter(f, compression, False, level)
+    if threaded_io:
+        f = ThreadedWriter(f, f is not path_or_fileobj)
+    return f
@@ -1,6 +1,6 @@
 from pypfp.core import Field
 from pypfp.core import FixedEngine
-from pypfp.peewee_adapter import PeeweeRecord
+from pypfp.peewee_adapter import PeeweeRecord, load_into_db
 from pypfp.converters import Float, Int, String
 
 from peewee import SqliteDatabase
@@ -37,6 +37,5 @@ db.connect()
 # create tables
 db.create_tables([Header, Address])
 
-# write fields to db using save
-for r in engine.load('../samples/sample_utf8.txt'):
-    r.save()
+# write records to db in batched inserts
+print load_into_db(engine, '../samples/sample_utf8.txt', batch_size=1000)
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 *-*
+import io
+import os
+import sys
+import csv
+import json
+import shutil
+import unittest
+
+from pypfp.core import FixedEngine
+from pypfp.batch import Batch, engine_from_spec, expand_inputs, main
+from pypfp.formats import record_writer
+from test.test_core import RecordA, RecordB
+
+
+class TestBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = FixedEngine([RecordA, RecordB], selector_slice=(0, 2))
+        self.objs = self.engine.load('samples/sample_utf8.txt')
+        self.dir = 'samples/test_batch'
+        self.out = 'samples/test_batch_out'
+        os.mkdir(self.dir)
+        self.paths = []
+        for i in range(5):
+            path = os.path.join(self.dir, 'f%d.txt' % i)
+            self.engine.save(path, self.objs * (i + 1))
+            self.paths.append(path)
+        gz = os.path.join(self.dir, 'f5.txt.gz')
+        self.engine.save(gz, self.objs)
+        self.paths.append(gz)
+
+    def tearDown(self):
+        for d in (self.dir, self.out):
+            if os.path.exists(d):
+                shutil.rmtree(d)
+
+    def test_inputs(self):
+        self.assertEqual(expand_inputs(self.dir), self.paths)
+        self.assertEqual(expand_inputs([self.dir + '/f[34].txt',
+                                        self.paths[0]]),
+                         self.paths[3:5] + self.paths[:1])
+
+    def test_records(self):
+        expected = self.objs * 16
+        for workers in (None, 2):
+            batch = self.engine.batch(self.dir, workers)
+            self.assertEqual(list(batch.records()), expected)
+            self.assertEqual([s.path for s in batch.summaries], self.paths)
+        batch = Batch(self.engine, self.dir, 3, ordered=False)
+        self.assertEqual(len(list(batch.records())), len(expected))
+
+    def test_no_files(self):
+        self.assertRaises(ValueError, Batch, self.engine, '/nonexist/*')
+        self.assertRaises(ValueError, self.engine.batch, [])
+
+    def test_summaries(self):
+        for workers in (None, 2):
+            summaries = list(self.engine.batch(self.paths, workers,
+                                               ordered=False).summarize())
+            summaries.sort()
+            self.assertEqual([s.lines for s in summaries],
+                             [{'RecordA': 2 * n, 'RecordB': 4 * n}
+                              for n in (1, 2, 3, 4, 5, 1)])
+            self.assertTrue(all(s.error is None for s in summaries))
+            self.assertEqual(summaries[0].bytes,
+                             os.path.getsize(self.paths[0]))
+
+    def test_convert(self):
+        summaries = list(self.engine.batch(self.dir, 2).convert(self.out))
+        self.assertEqual(sorted(os.listdir(self.out)),
+                         ['f%d.jsonl' % i for i in range(6)])
+        self.assertEqual(summaries[0].output,
+                         os.path.join(self.out, 'f0.jsonl'))
+        with open(summaries[1].output) as f:
+            rows = [json.loads(l) for l in f]
+        self.assertEqual(len(rows), 12)
+        self.assertEqual(rows[0], {'record': 'RecordA', 'typ': 1,
+                                   'name': u'ariel', 'age': 32,
+                                   'salary': 123.45})
+        self.assertEqual(rows[4]['address'], u'\xe1\xd1\xa1\xbf\xfc')
+
+    def test_failing_files(self):
+        with open(self.paths[2], 'ab') as f:
+            f.write('\n01ariel     XX000000123.4500')
+        self.assertRaises(ValueError, list, self.engine.batch(self.dir, 2)
+                          .records())
+        batch = self.engine.batch(self.dir, on_error='skip', max_errors=0)
+        self.assertEqual(len(list(batch.records())), 6 * 13)
+        self.assertTrue(batch.summaries[2].error.startswith('ValueError'))
+        summaries = list(self.engine.batch(self.dir, on_error='skip')
+                         .convert(self.out, 'csv'))
+        self.assertEqual(summaries[2].rejected, 1)
+        self.assertEqual(summaries[2].error, None)
+
+    def test_main(self):
+        stdout, sys.stdout = sys.stdout, io.BytesIO()
+        try:
+            self.assertEqual(main(['samples.records', self.dir, '--mode',
+                                   'convert', '--output-dir', self.out,
+                                   '--format', 'csv', '--workers', '2']), 0)
+            self.assertEqual(len(sys.stdout.getvalue().splitlines()), 7)
+        finally:
+            sys.stdout = stdout
+        with open(os.path.join(self.out, 'f0.csv'), 'rb') as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(rows[0], ['record', 'typ', 'name', 'age', 'salary',
+                                   'address', 'phone'])
+        self.assertEqual(rows[1], ['Header', '1', 'ariel', '32', '123.45',
+                                   '', ''])
+
+    def test_main_errors(self):
+        with open(self.paths[2], 'ab') as f:
+            f.write('\n01ariel     XX000000123.4500')
+        stdout, sys.stdout = sys.stdout, io.BytesIO()
+        stderr, sys.stderr = sys.stderr, io.BytesIO()
+        try:
+            self.assertEqual(main(['samples.records', self.dir]), 1)
+            self.assertIn("'XX'", sys.stderr.getvalue())
+            self.assertEqual(main(['samples.records', self.dir,
+                                   '--on-error', 'skip']), 0)
+            self.assertEqual(main(['samples.records', '/nonexist/*']), 1)
+            self.assertTrue(sys.stderr.getvalue().endswith(
+                'No files match /nonexist/*\n'))
+        finally:
+            sys.stdout, sys.stderr = stdout, stderr
+
+
+class TestFormats(unittest.TestCase):
+
+    def test_specs(self):
+        engine = engine_from_spec('samples.records')
+        self.assertEqual([r.__name__ for r in engine.records],
+                         ['Header', 'Address'])
+        self.assertEqual(engine_from_spec('samples.records:Header').records,
+                         [engine.records[0]])
+        self.assertRaises(AttributeError, engine_from_spec,
+                          'samples.records:X')
+
+    def test_csv_single_record(self):
+        engine = FixedEngine([RecordB])
+        out = io.BytesIO()
+        with record_writer('csv', engine, out) as w:
+            w.write(RecordB(typ=2, address=u'\xe1', phone=u'1'))
+        self.assertEqual(out.getvalue(), 'typ,address,phone\n2,\xc3\xa1,1\n')
+        self.assertRaises(ValueError, record_writer, 'xml', engine, out)
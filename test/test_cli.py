@@ -0,0 +1,88 @@
+# -*- coding: utf-8 *-*
+import io
+import os
+import json
+import unittest
+
+from pypfp.cli import main, output_format
+from pypfp.formats import pa
+from pypfp.streams import read_chunks, open_output
+
+SAMPLE = 'samples/sample_utf8.txt'
+
+
+class TestCli(unittest.TestCase):
+
+    def run_cli(self, *args, **kwargs):
+        self.out = io.BytesIO()
+        self.err = io.BytesIO()
+        return main(list(args), kwargs.get('stdin'), self.out, self.err)
+
+    def tearDown(self):
+        for fi in ('samples/test_cli.csv.gz', 'samples/test_cli.txt.gz',
+                   'samples/test_cli.parquet'):
+            if os.path.exists(fi):
+                os.remove(fi)
+
+    def test_jsonl_to_stdout(self):
+        self.assertEqual(self.run_cli('samples.records', SAMPLE), 0)
+        rows = [json.loads(l) for l in self.out.getvalue().splitlines()]
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[0]['record'], 'Header')
+        self.assertEqual(rows[4]['address'], u'\xe1\xd1\xa1\xbf\xfc')
+        self.assertTrue(self.err.getvalue().startswith('6 rows in '))
+
+    def test_stdin_and_workers(self):
+        with open(SAMPLE, 'rb') as f:
+            self.assertEqual(self.run_cli('samples.records', '-', '-f', 'csv',
+                                          '--selector-slice', '0:2', '-q',
+                                          stdin=f), 0)
+        csv = self.out.getvalue()
+        self.assertEqual(self.err.getvalue(), '')
+        self.assertEqual(self.run_cli('samples.records', SAMPLE, '-f', 'csv',
+                                      '--workers', '2'), 0)
+        self.assertEqual(self.out.getvalue(), csv)
+        self.assertEqual(len(csv.splitlines()), 7)
+
+    def test_compressed_file(self):
+        fi = 'samples/test_cli.csv.gz'
+        self.assertEqual(self.run_cli('samples.records', SAMPLE, '-o', fi), 0)
+        self.assertEqual(self.run_cli('samples.records', SAMPLE, '-f', 'csv'),
+                         0)
+        csv = self.out.getvalue()
+        self.assertEqual(''.join(read_chunks(fi)), csv)
+        # compressed input
+        f = open_output('samples/test_cli.txt.gz')
+        f.write(open(SAMPLE, 'rb').read())
+        f.close()
+        self.assertEqual(self.run_cli('samples.records',
+                                      'samples/test_cli.txt.gz', '-f', 'csv'),
+                         0)
+        self.assertEqual(self.out.getvalue(), csv)
+
+    def test_errors(self):
+        self.assertEqual(self.run_cli('test.test_core:RecordA', SAMPLE), 1)
+        self.assertTrue(self.err.getvalue().startswith('pypfp: '))
+        self.assertEqual(self.run_cli('test.test_core:RecordA', SAMPLE,
+                                      '--on-error', 'skip'), 0)
+        self.assertEqual(len(self.out.getvalue().splitlines()), 2)
+        self.assertTrue(self.err.getvalue().endswith('4 rejected lines\n'))
+        for args in (('samples.records', 'samples/missing.txt'),
+                     ('samples.missing', SAMPLE)):
+            self.assertEqual(self.run_cli(*args), 1)
+            self.assertTrue(self.err.getvalue().startswith('pypfp: '))
+            self.assertEqual(len(self.err.getvalue().splitlines()), 1)
+
+    @unittest.skipIf(pa is None, 'pyarrow not installed')
+    def test_parquet(self):
+        import pyarrow.parquet as pq
+        fi = 'samples/test_cli.parquet'
+        self.assertEqual(self.run_cli('samples.records', SAMPLE, '-o', fi), 0)
+        table = pq.read_table(fi)
+        self.assertEqual(table.num_rows, 6)
+        self.assertEqual(table.column_names[:3], ['record', 'typ', 'name'])
+
+    def test_output_format(self):
+        self.assertEqual(output_format('a.csv.bz2'), 'csv')
+        self.assertEqual(output_format('a.parquet'), 'parquet')
+        self.assertEqual(output_format('-'), 'jsonl')
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 *-*
+
+import unittest
+import os
+import io
+from pypfp.core import Field, Record, FixedEngine
+from pypfp.converters import Int, BigInt, Float, Decimal, String, DateTime
+from pypfp.columnar import np
+
+
+class Row(Record):
+    typ = Field(Int, 2)
+    name = Field(String, 10)
+    code = Field(String, 4, align='>', fill='0')
+    count = Field(BigInt, 6, align='<', fill=' ')
+    amount = Field(Float, 9, precision=4)
+    implied = Field(Float, 9, precision=2, decimal_separator='')
+    comma = Field(Float, 6, precision=2, decimal_separator=',')
+    sign = Field(Int, 5, align='=')
+    price = Field(Decimal, 8, precision=2, decimal_separator='')
+    day = Field(DateTime, 8, str_format='%Y%m%d')
+
+    class Meta:
+        selector_string = u'01'
+
+
+@unittest.skipIf(np is None, 'numpy not installed')
+class TestLoadColumns(unittest.TestCase):
+
+    lines = [u''.join(parts) for parts in [
+        [u'01', u'ariel     ', u'0012', u'123   ', u'0012.3400', u'000012345',
+         u'012,50', u'-0012', u'00001234', u'20121113'],
+        [u'01', u'lorena    ', u'A1BC', u'-5    ', u'0-12.3400', u'00-012345',
+         u'000,00', u'00000', u'00000000', u'20120101'],
+        [u'01', u'          ', u'0000', u'      ', u'000000000', u'000000000',
+         u'000,00', u'-0000', u'00000000', u'20121231']]]
+
+    def setUp(self):
+        self.path = 'samples/test_columns.txt'
+        with open(self.path, 'wb') as f:
+            f.write('\r\n'.join(self.lines))
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_same_values_as_load(self):
+        engine = FixedEngine([Row])
+        columns = engine.load_columns(self.path)
+        objects = engine.load(self.path)
+        self.assertEqual(list(columns), [f.name for f in
+                                         Row._record_options.fields])
+        for name, values in columns.items():
+            self.assertEqual(len(values), 3)
+            for obj, value in zip(objects, values):
+                self.assertEqual(getattr(obj, name), value)
+
+    def test_dtypes(self):
+        columns = FixedEngine([Row]).load_columns(self.path)
+        self.assertEqual(columns['typ'].dtype, np.int64)
+        self.assertEqual(columns['count'].dtype, np.int64)
+        self.assertEqual(columns['amount'].dtype, np.float64)
+        self.assertEqual(columns['implied'].dtype, np.float64)
+        self.assertEqual(columns['name'].dtype.kind, 'U')
+        self.assertEqual(columns['day'].dtype, object)
+        self.assertEqual(columns['implied'][1], -123.45)
+
+    def test_not_constant_length(self):
+        with open(self.path, 'ab') as f:
+            f.write('\n01')
+        self.assertRaises(ValueError, FixedEngine([Row]).load_columns,
+                          self.path)
+
+    def test_multi_byte_encoding(self):
+        class Name(Record):
+            n = Field(Int, 2)
+            name = Field(String, 3)
+        engine = FixedEngine([Name])
+        with io.open(self.path, 'w', encoding='utf-8') as f:
+            f.write(u'12\xf1ab\n34\xf1cd\n')
+        self.assertRaises(ValueError, engine.load_columns, self.path)
+        self.assertEqual([o.n for o in engine.load(self.path)], [12, 34])
+        with open(self.path, 'wb') as f:
+            f.write('12nab\n34ncd\n')
+        self.assertEqual(list(engine.load_columns(self.path)['n']), [12, 34])
+        self.assertRaises(ValueError, engine.load_columns, self.path,
+                          'utf-16')
+
+    def test_many_records(self):
+        class Other(Record):
+            typ = Field(Int, 2)
+            name = Field(String, 5)
+
+            class Meta:
+                selector_string = u'02'
+
+        with open(self.path, 'ab') as f:
+            f.write('\n02abc\n02defgh\n03')
+        engine = FixedEngine([Row, Other], selector_slice=(0, 2))
+        columns = engine.load_columns(self.path)
+        self.assertEqual(engine.unmatched, 1)
+        self.assertEqual(list(columns[Row]['typ']), [1, 1, 1])
+        self.assertEqual(list(columns[Other]['name']), [u'abc', u'defgh'])
+        custom = FixedEngine([Row, Other], engine.selector)
+        self.assertEqual(list(custom.load_columns(self.path)[Other]['typ']),
+                         [2, 2])
@@ -1,7 +1,7 @@
 # -*- coding: utf-8 *-*
 import unittest
 from pypfp.converters import Int, Float, Number, String, DateTime, Decimal
-from datetime import datetime
+from datetime import datetime, timedelta, tzinfo
 import decimal
 
 
@@ -52,6 +52,14 @@ class TestInt(unittest.TestCase):
     def test_cero(self):
         self._test(0, '0000', width=4)
 
+    def test_fast_path_fallback(self):
+        c = Int(width=5)
+        self.assertTrue(c.fast_path)
+        for s in ('00012', '00-12', '00000', '-0012'):
+            self.assertEquals(c.to_value(s), c._to_value(s))
+        self.assertEquals(Int(width=5, fill=' ').to_value('     '), 0)
+        self.assertFalse(Int(width=4, null_string='NULL').fast_path)
+
 
 class TestFloat(unittest.TestCase):
 
@@ -101,6 +109,30 @@ class TestFloat(unittest.TestCase):
         self._test(123.45, '00000012345', precision=2, width=11, fill='0',
                                                         decimal_separator='')
 
+    def test_fast_path_same_values(self):
+        for params in ({}, {'decimal_separator': ''}, {'fill': ' '}):
+            c = Float(width=12, precision=3, **params)
+            self.assertTrue(c.fast_path)
+            for i in range(-5000, 5000, 7):
+                for value in (i * 1.001, i * 0.001):
+                    s = c.to_string(value)
+                    self.assertEquals(c.to_value(s), c._to_value(s))
+
+    def test_implied_decimals_under_one(self):
+        for params in ({'width': 10}, {'width': 10, 'null_string': ' ' * 10},
+                       {'width': 16}):
+            c = Float(precision=2, decimal_separator='', **params)
+            s = '5'.rjust(c.width, '0')
+            self.assertEquals(c.to_value(s), 0.05)
+            self.assertEquals(c._to_value(s), 0.05)
+        c = Float(5, precision=2, decimal_separator='', align='=')
+        self.assertEquals(c.to_value('00005'), 0.05)
+        self.assertEquals(c.to_value('-0005'), -0.05)
+        self.assertEquals(c.to_value('-0000'), 0)
+
+    def test_no_fast_path_for_wide_implied_decimals(self):
+        self.assertFalse(Float(width=16, decimal_separator='').fast_path)
+
 
 class TestDecimal(unittest.TestCase):
 
@@ -114,21 +146,40 @@ class TestDecimal(unittest.TestCase):
         self.assertRaises(AssertionError, Decimal, width=14,
                             decimal_separator='', align='<')
 
+    def test_implied_decimals_under_one(self):
+        for params in ({}, {'null_string': ' ' * 10}):
+            c = Decimal(10, precision=2, decimal_separator='', **params)
+            self.assertEquals(c.to_value('0000000005'),
+                              decimal.Decimal('0.05'))
+        c = Decimal(5, precision=2, decimal_separator='', align='=')
+        self.assertEquals(c.to_value('00005'), decimal.Decimal('0.05'))
+        self.assertEquals(c.to_value('-0005'), decimal.Decimal('-0.05'))
+
     def test_positive_decimal_with_separator(self):
-        self._test(decimal.Decimal(12.34), '0012.3400', precision=4, width=9)
+        self._test(decimal.Decimal('12.34'), '0012.3400', precision=4, width=9)
 
     def test_negative_decimal_with_separator(self):
-        self._test(decimal.Decimal(-12.34), '0-12.3400', precision=4,
+        self._test(decimal.Decimal('-12.34'), '0-12.3400', precision=4,
                     width=9)
 
     def test_cero(self):
-        self._test(decimal.Decimal(0), '0000.0000', precision=4,
+        self._test(decimal.Decimal('0'), '0000.0000', precision=4,
                     width=9, fill='0')
 
     def test_precision_2(self):
-        self._test(decimal.Decimal(123.45), '00000012345', precision=2,
+        self._test(decimal.Decimal('123.45'), '00000012345', precision=2,
                     width=11, fill='0', decimal_separator='')
 
+    def test_exact_values(self):
+        c = Decimal(width=20, precision=2, decimal_separator='')
+        self.assertEquals(str(c.to_value('00123456789012345678')),
+                          '1234567890123456.78')
+        self.assertEquals(str(c.to_value('000000000000000-1234')), '-12.34')
+        c = Decimal(width=9, precision=4, align='=', fill=' ')
+        self.assertEquals(str(c.to_value('-  1.2345')), '-1.2345')
+        c = Decimal(width=9, precision=2, decimal_separator=',')
+        self.assertEquals(str(c.to_value('000012,50')), '12.50')
+
 
 class TestString(unittest.TestCase):
 
@@ -190,3 +241,61 @@ class TestDateTime(unittest.TestCase):
     def test_none_value_not_allowed(self):
         self.assertRaises(ValueError, self._test, None, '    /  /  ', width=12,
                             str_format='%Y/%m/%d')
+
+    def test_fast_formats(self):
+        for str_format in ('%Y%m%d', '%d%m%Y', '%Y%m%d%H%M%S'):
+            width = len(self.today.strftime(str_format))
+            self._test(self.today, self.today.strftime(str_format),
+                       width=width, str_format=str_format)
+
+    def test_fast_formats_invalid_strings(self):
+        invalid = {
+            '%Y%m%d': ['2012x113', '20121313', '00000000', '2012-113'],
+            '%d%m%Y': ['32112012', '1311201a', '13110000', '13+12012'],
+            '%Y%m%d%H%M%S': ['20121113250352', '2012111323036x'],
+        }
+        for str_format, strings in invalid.items():
+            c = DateTime(14, str_format)
+            for s in strings:
+                self.assertRaises(ValueError, c.to_value, s)
+
+    def test_cache_is_bounded(self):
+        c = DateTime(8, '%Y%m%d', cache_size=3)
+        for day in range(1, 10):
+            s = '201201%02d' % day
+            self.assertEquals(c.to_value(s), datetime(2012, 1, day))
+            self.assertEquals(c.to_string(datetime(2012, 1, day)), s)
+        self.assertTrue(sum(map(len, c._values)) <= 3)
+        self.assertTrue(sum(map(len, c._strings)) <= 3)
+
+    def test_cache_keeps_recently_used(self):
+        c = DateTime(8, '%Y%m%d', cache_size=4)
+        c.to_value('20120101')
+        for day in range(2, 10):
+            c.to_value('201201%02d' % day)
+            # used again before every miss, so never evicted
+            c.to_value('20120101')
+            self.assertIn('20120101', c._values[0])
+
+    def test_cache_of_aware_values(self):
+        class Zone(tzinfo):
+            def __init__(self, hours):
+                self.hours = hours
+
+            def utcoffset(self, value):
+                return timedelta(hours=self.hours)
+
+            def dst(self, value):
+                return timedelta(0)
+        c = DateTime(12, '%Y%m%d%H%M')
+        utc = datetime(2020, 1, 1, 12, tzinfo=Zone(0))
+        local = datetime(2020, 1, 1, 9, tzinfo=Zone(-3))
+        self.assertEqual(utc, local)
+        self.assertEqual(c.to_string(utc), '202001011200')
+        self.assertEqual(c.to_string(local), '202001010900')
+
+    def test_without_cache(self):
+        c = DateTime(8, '%Y%m%d', cache_size=0)
+        self.assertEquals(c.to_value('20121113'), datetime(2012, 11, 13))
+        self.assertEquals(c.to_string(datetime(2012, 11, 13)), '20121113')
+        self.assertEquals(c._values, [{}, {}])
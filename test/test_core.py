@@ -1,11 +1,18 @@
 # -*- coding: utf-8 *-*
 
 import unittest
-from pypfp.core import Field, Record
-from pypfp.core import FixedEngine
-from pypfp.converters import Float, Int, String  # , DateTime
+from pypfp.core import Field, Record, RecordMetaClass
+from pypfp.core import FixedEngine, iter_lines, check_single_byte, Prefix
+from pypfp.core import LineSplitter
+from pypfp.parallel import iter_parallel
+from pypfp.stats import LoadCounts
+from pypfp.core import value_validator
+from pypfp.converters import Float, Int, String, BigInt, Decimal, DateTime
 import os
+import io
+import pickle
 import datetime
+import threading
 
 class Foo(Record):
 
@@ -40,6 +47,52 @@ class RecordB(Foo):
         selector_string = u'02'
 
 
+class Compact(Record):
+    typ = Field(Int, 2)
+    name = Field(String, 10, default=u'default')
+    salary = Field(Float, 14, start=14, precision=4)
+
+    class Meta:
+        compact = True
+        selector_string = u'01'
+
+    def __eq__(self, other):
+        return type(self) is type(other) and all(
+            getattr(self, f.name) == getattr(other, f.name)
+            for f in self._record_options.fields)
+
+
+class TestCompactRecord(unittest.TestCase):
+
+    def test_slots(self):
+        c = Compact(typ=1)
+        self.assertFalse(hasattr(c, '__dict__'))
+        self.assertEqual(Compact.__slots__, ('typ', 'name', 'salary'))
+        self.assertEqual(c.name, u'default')
+        self.assertEqual(c.typ, 1)
+        self.assertRaises(AttributeError, setattr, c, 'other', 1)
+
+    def test_load_and_save(self):
+        engine = FixedEngine([Compact], selector_slice=(0, 2))
+        objs = engine.load('samples/sample_utf8.txt')
+        self.assertEqual(len(objs), 2)
+        self.assertEqual(objs[1].name, u'lorena')
+        self.assertEqual(objs[1].salary, 678.99)
+        self.assertEqual(engine.load('samples/sample_utf8.txt', workers=2),
+                         objs)
+        out = io.BytesIO()
+        engine.save(out, objs)
+        self.assertEqual(out.getvalue(), '01ariel       000000123.4500\n'
+                                         '01lorena      000000678.9900')
+
+    def test_pickle(self):
+        engine = FixedEngine([Compact], selector_slice=(0, 2))
+        objs = engine.load('samples/sample_utf8.txt')
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            self.assertEqual(pickle.loads(pickle.dumps(objs, protocol)),
+                             objs)
+
+
 class TestRecordDefinition(unittest.TestCase):
 
     def setUp(self):
@@ -102,6 +155,175 @@ class TestRecordDefinition(unittest.TestCase):
         self.assertEqual(a.name, u'default')
 
 
+class Mixed(Foo):
+    i1 = Field(Int, 5)
+    i2 = Field(Int, 5, align='<', fill=' ')
+    i3 = Field(Int, 5, align='=')
+    i4 = Field(Int, 4, null_string='NULL')
+    b1 = Field(BigInt, 12, validator=value_validator(123))
+    f1 = Field(Float, 9, precision=4)
+    f2 = Field(Float, 9, precision=4, decimal_separator='')
+    f3 = Field(Float, 9, precision=4, decimal_separator=',', align='<',
+               fill=' ')
+    f4 = Field(Float, 9, precision=2, align='=', fill=' ')
+    d1 = Field(Decimal, 11, precision=2, decimal_separator='')
+    s1 = Field(String, 6)
+    s2 = Field(String, 6, align='^', fill='*')
+    s3 = Field(String, 6, clean_function=lambda s: s.upper())
+    t1 = Field(DateTime, 8, str_format='%Y%m%d')
+    t2 = Field(DateTime, 10, str_format='%d/%m/%Y', null_string='  /  /    ')
+
+
+def generic_to_value(record, line):
+    obj = record()
+    for field in record._record_options.fields:
+        field.to_value(line[field.start:field.start + field.width], obj)
+    return obj
+
+
+class TestCompiledParser(unittest.TestCase):
+
+    lines = [u''.join([u'00-12', u'10   ', u'-0012', u'NULL',
+                       u'000000000123', u'0012.3400', u'00-123400',
+                       u'-12,3400 ', u'-   12.50', u'00000012345', u'ab    ',
+                       u'**x***', u'abc   ', u'20121113', u'13/11/2012']),
+             u''.join([u'00000', u'     ', u'00000', u'0000',
+                       u'000000000123', u'000000000', u'000000000',
+                       u'.        ', u'-    0.00', u'00000000000', u'      ',
+                       u'******', u'      ', u'20120101', u'  /  /    '])]
+
+    def test_same_values_as_fields(self):
+        for line in self.lines:
+            self.assertEqual(Mixed.to_value(line), generic_to_value(Mixed,
+                                                                    line))
+
+    def test_values(self):
+        obj = Mixed.to_value(self.lines[0])
+        self.assertEqual(obj.i1, -12)
+        self.assertEqual(obj.i2, 10)
+        self.assertEqual(obj.i3, -12)
+        self.assertIsNone(obj.i4)
+        self.assertEqual(obj.f2, -12.34)
+        self.assertEqual(obj.f3, -12.34)
+        self.assertEqual(obj.s2, u'x')
+        self.assertEqual(obj.s3, u'ABC')
+        self.assertEqual(obj.t1, datetime.datetime(2012, 11, 13))
+        self.assertIsNone(Mixed.to_value(self.lines[1]).t2)
+
+    def test_implied_decimals_under_one(self):
+        class Small(Foo):
+            f1 = Field(Float, 10, precision=2, decimal_separator='',
+                       null_string=' ' * 10)
+            f2 = Field(Float, 16, precision=2, decimal_separator='')
+        line = u'0000000005' + u'0' * 15 + u'5'
+        obj = Small.to_value(line)
+        self.assertEqual((obj.f1, obj.f2), (0.05, 0.05))
+        self.assertEqual(obj, generic_to_value(Small, line))
+
+    def test_to_tuple(self):
+        for line in self.lines:
+            obj = Mixed.to_value(line)
+            self.assertEqual(Mixed.to_tuple(line), tuple(
+                getattr(obj, f.name) for f in Mixed._record_options.fields))
+
+    def test_validator(self):
+        line = self.lines[0].replace(u'000000000123', u'000000000124')
+        self.assertRaises(ValueError, Mixed.to_value, line)
+
+
+class TestBytesMode(unittest.TestCase):
+
+    lines = [l.replace(u'ab    ', u'\xe1\xd1    ')
+             for l in TestCompiledParser.lines]
+
+    def test_same_values_as_decoded_lines(self):
+        for encoding in ('latin-1', 'cp1252'):
+            for line in self.lines:
+                self.assertEqual(Mixed.bytes_to_value(line.encode(encoding),
+                                                      encoding),
+                                 Mixed.to_value(line))
+        obj = Mixed.bytes_to_value(self.lines[0].encode('latin-1'), 'latin-1')
+        self.assertEqual(obj.s1, u'\xe1\xd1')
+        self.assertIsInstance(obj.s3, unicode)
+
+    def test_single_byte_encodings(self):
+        for encoding in ('latin-1', 'cp1252', 'ascii', 'cp850'):
+            check_single_byte(encoding)
+        for encoding in ('utf-8', 'utf-16', 'shift_jis', 'gbk'):
+            self.assertRaises(ValueError, check_single_byte, encoding)
+        self.assertRaises(ValueError, Mixed.bytes_to_value, '', 'utf-8')
+
+    def test_load(self):
+        objs = [Mixed.to_value(l) for l in self.lines]
+        engine = FixedEngine([Mixed])
+        fi = 'samples/test_bytes.txt'
+        engine.save(fi, objs, 'latin-1')
+        objs = engine.load(fi, 'latin-1')
+        self.assertEqual(engine.load(fi, 'latin-1', bytes_mode=True), objs)
+        self.assertEqual(engine.load(fi, 'latin-1', workers=2,
+                                     bytes_mode=True), objs)
+        with open(fi, 'rb') as f:
+            self.assertEqual(list(engine.iter_load(f, 'latin-1',
+                                                   bytes_mode=True)), objs)
+        self.assertRaises(ValueError, engine.load, fi, bytes_mode=True)
+        os.remove(fi)
+
+    def test_selectors(self):
+        a = RecordA(typ=1, name=u'\xe1rbol', age=3, salary=1.5)
+        b = RecordB(typ=2, address=u'\xd1', phone=u'1')
+        line_a = RecordA.to_string(a).encode('cp1252')
+        line_b = RecordB.to_string(b).encode('cp1252')
+        selectors = {'01': RecordA, '02': RecordB}
+        for engine in (FixedEngine([RecordA, RecordB], selector_slice=(0, 2)),
+                       FixedEngine([RecordA, RecordB],
+                                   lambda l: selectors.get(l[:2]))):
+            objs = list(engine.parse_lines([line_a, '03', line_b], 'cp1252'))
+            self.assertEqual(objs, [a, b])
+            self.assertEqual(engine.unmatched, 1)
+
+
+def generic_to_string(record, obj):
+    return record._record_options.string_format.format(
+        *[x.to_string(obj) for x in record._record_options.fields])
+
+
+class TestCompiledSerializer(unittest.TestCase):
+
+    def setUp(self):
+        self.objs = [Mixed.to_value(line)
+                     for line in TestCompiledParser.lines]
+        self.objs[0].t2 = None
+
+    def test_same_line_as_fields(self):
+        for obj in self.objs:
+            self.assertEqual(Mixed.to_string(obj),
+                             generic_to_string(Mixed, obj))
+
+    def test_round_trip(self):
+        a = RecordA(typ=1, name=u'ariel', age=32, salary=123.45)
+        self.assertEqual(RecordA.to_value(RecordA.to_string(a)), a)
+
+    def test_too_long(self):
+        obj = self.objs[0]
+        obj.s1 = u'too long value'
+        self.assertRaises(ValueError, Mixed.to_string, obj)
+
+    def test_truncate(self):
+        b = RecordB(typ=2, address=u'street 1234 5678', phone=u'1')
+        self.assertEqual(RecordB.to_string(b),
+                         u'02street 1231' + u' ' * 19)
+
+    def test_invalid_value(self):
+        obj = self.objs[0]
+        obj.i1 = None
+        self.assertRaises(ValueError, Mixed.to_string, obj)
+
+    def test_overflow_like_fields(self):
+        obj = self.objs[0]
+        obj.i1 = 1234567
+        self.assertEqual(Mixed.to_string(obj), generic_to_string(Mixed, obj))
+
+
 class TestField(unittest.TestCase):
 
     def setUp(self):
@@ -199,6 +421,60 @@ class TestFixedEngine(unittest.TestCase):
         self.assertIs(r.find_record(obj_a), RecordA)
         self.assertIs(r.find_record(obj_b), RecordB)
 
+    def test_selector_slices(self):
+        class RecordC(Foo):
+            typ = Field(String, 4)
+
+            class Meta:
+                selector_string = u'0300'
+
+        r = FixedEngine([RecordA, RecordB, RecordC],
+                        selector_slice=[(2, 6), (0, 2)])
+        self.assertIs(r.selector('01Ariel'), RecordA)
+        self.assertIs(r.selector('--0300'), RecordC)
+        self.assertIsNone(r.selector('0300'))
+
+    def test_selector_prefix(self):
+        class RecordC(Foo):
+            typ = Field(String, 4)
+
+            class Meta:
+                selector_string = u'0201'
+
+        r = FixedEngine([RecordA, RecordB, RecordC], selector_prefix=True)
+        self.assertIs(r.selector('01Ariel'), RecordA)
+        self.assertIs(r.selector('0202'), RecordB)
+        self.assertIs(r.selector('0201'), RecordC)
+        self.assertIsNone(r.selector('03'))
+
+    def test_unmatched_lines(self):
+        f = FixedEngine([RecordA], selector_slice=(0, 2))
+        objects = f.load('samples/sample_utf8.txt')
+        self.assertEqual(len(objects), 2)
+        self.assertEqual(f.unmatched, 4)
+        self.assertEqual(len(f.load('samples/sample_utf8.txt', workers=2)),
+                         2)
+        self.assertEqual(f.unmatched, 4)
+
+    def test_unmatched_lines_per_load(self):
+        f = FixedEngine([RecordA], selector_slice=(0, 2))
+        for workers in (None, 2):
+            counts = [LoadCounts(), LoadCounts()]
+            loads = [f.iter_load('samples/sample_utf8.txt', workers=workers,
+                                 counts=c) for c in counts]
+            # both are running before either ends
+            self.assertEqual([next(l) for l in loads], [self.objs[0]] * 2)
+            self.assertEqual(sum(len(list(l)) for l in loads), 2)
+            self.assertEqual([c.unmatched for c in counts], [4, 4])
+            self.assertEqual(f.unmatched, 4)
+
+    def test_load_grouped(self):
+        f = FixedEngine([RecordA, RecordB], selector_slice=(0, 2))
+        groups = f.load_grouped('samples/sample_utf8.txt')
+        self.assertEqual(groups[RecordA], [self.objs[0], self.objs[3]])
+        self.assertEqual(groups[RecordB], [o for o in self.objs
+                                           if type(o) is RecordB])
+
     def test_save(self):
         f = FixedEngine([RecordA, RecordB], self.selector)
         fi = 'samples/test_sample1.txt'
@@ -209,6 +485,34 @@ class TestFixedEngine(unittest.TestCase):
         self.assertEquals(''.join(lines1), ''.join(lines2))
         os.remove(fi)
 
+    def test_save_lazy_iterable(self):
+        f = FixedEngine([RecordA, RecordB], self.selector)
+        fi = 'samples/test_sample2.txt'
+        f.save(fi, (o for o in self.objs), buffer_size=10)
+        self.assertEqual(open(fi, 'rb').read(),
+                         open('samples/sample_utf8.txt', 'rb').read())
+        os.remove(fi)
+
+    def test_writer_binary_stream(self):
+        f = FixedEngine([RecordA, RecordB], self.selector,
+                        end_with_new_line=True)
+        out = io.BytesIO()
+        with f.writer(out, buffer_size=40) as w:
+            for obj in self.objs:
+                w.write(obj)
+        self.assertEqual(w.count, len(self.objs))
+        self.assertEqual(out.getvalue(),
+                         open('samples/sample_utf8.txt', 'rb').read() + '\n')
+
+    def test_writer_text_stream(self):
+        f = FixedEngine([RecordA, RecordB], self.selector)
+        out = io.StringIO()
+        with f.writer(out) as w:
+            for obj in self.objs:
+                w.write(obj)
+        data = open('samples/sample_utf8.txt', 'rb').read().decode('utf-8')
+        self.assertEqual(out.getvalue(), data)
+
     def test_load(self):
         f = FixedEngine([RecordA, RecordB], self.selector)
         objects = f.load('samples/sample_utf8.txt')
@@ -216,8 +520,347 @@ class TestFixedEngine(unittest.TestCase):
         for y, t in zip(objects, self.objs):
             self.assertEqual(y, t)
 
+    def test_iter_load_is_lazy(self):
+        f = FixedEngine([RecordA, RecordB], self.selector)
+        it = f.iter_load('samples/sample_utf8.txt')
+        self.assertEqual(next(it), self.objs[0])
+        self.assertEqual(list(it), self.objs[1:])
+
+    def test_iter_load_binary_stream(self):
+        f = FixedEngine([RecordA, RecordB], self.selector)
+        data = open('samples/sample_utf8.txt', 'rb').read()
+        objects = list(f.iter_load(io.BytesIO(data)))
+        self.assertEqual(objects, self.objs)
+
+    def test_iter_load_text_stream(self):
+        f = FixedEngine([RecordA, RecordB], self.selector)
+        data = open('samples/sample_utf8.txt', 'rb').read().decode('utf-8')
+        objects = list(f.iter_load(io.StringIO(data)))
+        self.assertEqual(objects, self.objs)
+
+
+class TestIterLines(unittest.TestCase):
+
+    def test_same_lines_as_readlines(self):
+        text = u'01ab\r\n02\u00e1\u00d1\r\r\n\n03end'
+        fi = 'samples/test_lines.txt'
+        with open(fi, 'wb') as f:
+            f.write(text.encode('utf-8'))
+        for size in range(1, 8):
+            self.assertEqual(list(iter_lines(fi, 'utf-8', size)),
+                             text.splitlines(True))
+        self.assertEqual(list(iter_lines(io.BytesIO(text.encode('utf-8')))),
+                         text.splitlines(True))
+        with open(fi, 'rb') as f:
+            f.readline()
+            self.assertEqual(list(iter_lines(f, 'utf-8', 3)),
+                             text.splitlines(True)[1:])
+
+        class Lines(object):
+            def __init__(self, data):
+                self.readline = io.BytesIO(data).readline
+        self.assertEqual(list(iter_lines(Lines(text.encode('utf-8')))),
+                         text.splitlines(True))
+        os.remove(fi)
+
+    def test_empty_stream(self):
+        self.assertEqual(list(iter_lines(io.BytesIO(''))), [])
+
+    def test_complete_line_of_a_pipe(self):
+        # the line comes out before the writer sends the next one
+        read, write = os.pipe()
+        os.write(write, '01ariel     32000000123.4500\n')
+        later = threading.Timer(5, os.write,
+                                (write, '02galvez 60 1234-234\n'))
+        later.start()
+        try:
+            with os.fdopen(read, 'rb') as f:
+                engine = FixedEngine([RecordA, RecordB],
+                                     selector_slice=(0, 2))
+                self.assertEqual(next(engine.iter_load(f)).name, u'ariel')
+                self.assertTrue(later.is_alive())
+        finally:
+            later.cancel()
+            later.join()
+            os.close(write)
+
+    def test_pending_pieces(self):
+        splitter = LineSplitter()
+        self.assertEqual(splitter.feed('01a\n02'), [u'01a\n'])
+        self.assertEqual(splitter.feed('b\r'), [])
+        self.assertEqual(splitter.feed('\n03'), [u'02b\r\n'])
+        self.assertEqual(splitter.close(), [u'03'])
+
+
+class TestLazyRecords(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = FixedEngine([RecordA, RecordB], selector_slice=(0, 2),
+                                  lazy=True)
+        self.path = 'samples/sample_utf8.txt'
+        self.objs = FixedEngine([RecordA, RecordB],
+                                selector_slice=(0, 2)).load(self.path)
+
+    def assertSameFields(self, obj, other):
+        self.assertIsInstance(obj, type(other))
+        for f in type(other)._record_options.fields:
+            self.assertEqual(getattr(obj, f.name), getattr(other, f.name))
+
+    def test_convert_on_access(self):
+        objs = self.engine.load(self.path)
+        self.assertEqual(len(objs), len(self.objs))
+        obj = objs[0]
+        self.assertEqual(type(obj).__name__, 'RecordA')
+        self.assertIs(self.engine.find_record(obj), RecordA)
+        self.assertEqual(obj.__dict__.keys(), ['_line'])
+        self.assertEqual(obj.age, 32)
+        self.assertEqual(sorted(obj.__dict__), ['_line', 'age'])
+        for obj, other in zip(objs, self.objs):
+            self.assertSameFields(obj, other)
+        self.assertEqual(type(objs[0]).name, u'default')
+
+    def test_save_untouched_and_changed(self):
+        objs = self.engine.load(self.path)
+        fi = 'samples/test_lazy.txt'
+        self.engine.save(fi, objs)
+        self.assertEqual(open(fi, 'rb').read(), open(self.path, 'rb').read())
+        objs[0].name = u'changed'
+        objs[1].phone
+        self.engine.save(fi, objs)
+        self.assertEqual(self.engine.load(fi)[0].name, u'changed')
+        self.assertEqual(open(fi, 'rb').read().splitlines()[1:],
+                         open(self.path, 'rb').read().splitlines()[1:])
+        os.remove(fi)
+
+    def test_errors_on_access(self):
+        line = u'01ariel     XX000000123.4500'
+        obj = list(self.engine.parse_lines([line]))[0]
+        self.assertEqual(obj.name, u'ariel')
+        self.assertRaises(ValueError, lambda: obj.age)
 
+    def test_pickle_and_parallel(self):
+        obj = self.engine.load(self.path)[0]
+        obj.age = 40
+        copy = pickle.loads(pickle.dumps(obj))
+        self.assertEqual(type(copy), type(obj))
+        self.assertEqual(copy.age, 40)
+        self.assertEqual(copy.salary, 123.45)
+        for obj, other in zip(self.engine.load(self.path, workers=2),
+                              self.objs):
+            self.assertSameFields(obj, other)
 
+    def test_compact(self):
+        line = Compact.to_string(Compact(typ=1, name=u'x', salary=2.5))
+        obj = Compact.lazy_value(line)
+        self.assertIsInstance(obj, Compact)
+        self.assertSameFields(obj, Compact.to_value(line))
+        self.assertEqual(Compact.to_string(obj), line)
 
+    def test_mapped(self):
+        with self.engine.mapped(self.path) as r:
+            self.assertEqual(r[0].__dict__.keys(), ['_line'])
+            self.assertSameFields(r[4], self.objs[4])
 
+    def test_peewee_like_records_are_rejected(self):
+        class Meta(RecordMetaClass):
+            pass
+        Other = Meta('Other', (Record,), {'f': Field(Int, 2)})
+        self.assertRaises(TypeError, Other.lazy_value, u'01')
 
+
+class Transport(object):
+    # like the transports of event loops, only write
+
+    def __init__(self):
+        self.data = []
+
+    def write(self, data):
+        self.data.append(data)
+
+
+class TestPushParser(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = FixedEngine([RecordA, RecordB], selector_slice=(0, 2))
+        self.objs = self.engine.load('samples/sample_utf8.txt')
+        self.data = open('samples/sample_utf8.txt', 'rb').read()
+
+    def test_pieces(self):
+        for size in (1, 3, 7, 100):
+            parser = self.engine.push_parser()
+            objs = []
+            for i in range(0, len(self.data), size):
+                objs.extend(parser.feed(self.data[i:i + size]))
+            # the last line has no new line
+            self.assertEqual(objs, self.objs[:-1])
+            self.assertEqual(parser.close(), self.objs[-1:])
+            self.assertEqual(parser.line_number, len(self.objs))
+
+    def test_complete_line_in_one_feed(self):
+        parser = self.engine.push_parser()
+        lines = self.data.splitlines(True)
+        self.assertEqual(parser.feed(lines[0]), self.objs[:1])
+        self.assertEqual(parser.feed(lines[1][:5]), [])
+        self.assertEqual(parser.feed(lines[1][5:] + lines[2]),
+                         self.objs[1:3])
+        self.assertEqual(parser.close(), [])
+
+    def test_bytes_mode_and_unmatched(self):
+        engine = FixedEngine([RecordA], selector_slice=(0, 2))
+        parser = engine.push_parser('latin-1', bytes_mode=True)
+        objs = parser.feed(self.data) + parser.close()
+        self.assertEqual(objs, engine.load('samples/sample_utf8.txt',
+                                           'latin-1'))
+        self.assertEqual(parser.unmatched, 4)
+
+    def test_rejects(self):
+        out = io.BytesIO()
+        parser = self.engine.push_parser(on_error='skip', rejects=out)
+        bad = '01ariel     XX000000123.4500\n'
+        objs = parser.feed(bad + bad[:10])
+        objs += parser.feed(bad[10:] + self.data)
+        objs += parser.close()
+        self.assertEqual(objs, self.objs)
+        self.assertEqual([l.split('\t')[0]
+                          for l in out.getvalue().splitlines()], ['1', '2'])
+
+    def test_writer_to_transport(self):
+        transport = Transport()
+        with self.engine.writer(transport, buffer_size=50) as w:
+            for obj in self.objs:
+                w.write(obj)
+        self.assertTrue(len(transport.data) > 1)
+        self.assertEqual(''.join(transport.data), self.data)
+
+
+class TestParallelLoad(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = FixedEngine([RecordA, RecordB], selector_slice=(0, 2))
+        self.objs = self.engine.load('samples/sample_utf8.txt') * 50
+        self.path = 'samples/test_parallel.txt'
+        self.engine.save(self.path, self.objs)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_ordered(self):
+        objects = list(iter_parallel(self.engine, self.path, workers=3,
+                                     chunk_size=100))
+        self.assertEqual(objects, self.objs)
+        self.assertEqual(self.engine.load(self.path, workers=2), self.objs)
+
+    def test_unordered(self):
+        objects = list(iter_parallel(self.engine, self.path, workers=3,
+                                     ordered=False, chunk_size=100))
+        key = lambda o: (type(o).__name__, sorted(o.__dict__.items()))
+        self.assertEqual(sorted(objects, key=key), sorted(self.objs, key=key))
+
+    def test_stream(self):
+        with open(self.path, 'rb') as f:
+            objects = list(self.engine.iter_load(f, workers=2))
+        self.assertEqual(objects, self.objs)
+
+    def test_error_in_worker(self):
+        with open(self.path, 'ab') as f:
+            f.write('\n01ariel     XX000000123.4500')
+        self.assertRaises(ValueError, self.engine.load, self.path, workers=2)
+
+
+class TestQuery(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = FixedEngine([RecordA, RecordB], selector_slice=(0, 2))
+        self.path = 'samples/sample_utf8.txt'
+        self.objs = self.engine.load(self.path)
+
+    def test_where_value(self):
+        objs = self.engine.load(self.path, where={'age': 30})
+        self.assertEqual(objs, [self.objs[3]])
+        # the lines of records without an age are left out too
+        self.assertEqual(self.engine.filtered, 5)
+        objs = self.engine.load(self.path, where={'phone': u'1234-234'})
+        self.assertEqual(objs, [o for o in self.objs
+                                if isinstance(o, RecordB)])
+
+    def test_where_set_prefix_and_function(self):
+        self.assertEqual(self.engine.load(self.path,
+                                          where={'age': set([30, 32])}),
+                         [self.objs[0], self.objs[3]])
+        self.assertEqual(self.engine.load(self.path,
+                                          where={'name': Prefix(u'lo')}),
+                         [self.objs[3]])
+        self.assertEqual(self.engine.load(
+            self.path, where={'address': lambda s: s.startswith(u'raf')}),
+            [self.objs[2], self.objs[5]])
+
+    def test_several_conditions(self):
+        self.assertEqual(self.engine.load(
+            self.path, where={'address': Prefix(u'rafaela'),
+                              'phone': u'1234-234'}),
+            [self.objs[2], self.objs[5]])
+
+    def test_projection(self):
+        objs = self.engine.load(self.path, fields=['typ', 'salary'],
+                                where={'name': Prefix(u'ariel')})
+        self.assertEqual(len(objs), 1)
+        self.assertEqual((objs[0].typ, objs[0].salary), (1, 123.45))
+        self.assertEqual(objs[0].name, u'default')
+        self.assertEqual(objs[0].age, datetime.datetime.today().day)
+        objs = self.engine.load(self.path, fields=['phone'])
+        self.assertEqual(len(objs), 6)
+        self.assertEqual(objs[1].phone, self.objs[1].phone)
+        self.assertNotIn('address', objs[1].__dict__)
+        self.assertEqual(objs[0].__dict__, {})
+
+    def test_bytes_mode(self):
+        where = {'address': set([u'\xe1\xd1\xa1\xbf\xfc', u'galvez 60'])}
+        objs = self.engine.load(self.path, 'latin-1')
+        self.assertEqual(self.engine.load(self.path, 'latin-1',
+                                          bytes_mode=True, where=where),
+                         self.engine.load(self.path, 'latin-1', where=where))
+        self.assertEqual(self.engine.load(self.path, where=where),
+                         [self.objs[1], self.objs[4]])
+        self.assertEqual(len(objs), 6)
+
+    def test_parallel(self):
+        path = 'samples/test_query.txt'
+        self.engine.save(path, self.objs * 50)
+        try:
+            objs = self.engine.load(path, workers=2, where={'age': 32})
+        finally:
+            os.remove(path)
+        self.assertEqual(objs, [self.objs[0]] * 50)
+        self.assertEqual(self.engine.filtered, 250)
+
+    def test_lazy(self):
+        self.engine.lazy = True
+        objs = self.engine.load(self.path, where={'age': 30})
+        self.assertEqual(len(objs), 1)
+        self.assertEqual(objs[0].salary, 678.99)
+
+    def test_unknown_field(self):
+        self.assertRaises(ValueError, self.engine.load, self.path,
+                          where={'nope': 1})
+        self.assertRaises(ValueError, self.engine.load, self.path,
+                          fields=['nope'])
+
+    def test_invalid_where_value(self):
+        for on_error in ('raise', 'collect'):
+            self.assertRaises(ValueError, self.engine.iter_load, self.path,
+                              where={'name': u'a much too long name'},
+                              on_error=on_error)
+
+    def test_without_query(self):
+        self.engine.load(self.path, where={'age': 30})
+        self.assertEqual(self.engine.load(self.path), self.objs)
+
+    def test_parallel_query_is_per_load(self):
+        path = 'samples/test_query.txt'
+        self.engine.save(path, self.objs * 50)
+        try:
+            objs = self.engine.iter_load(path, workers=2, where={'age': 32})
+            self.engine.load(path)
+            self.assertEqual(list(objs), [self.objs[0]] * 50)
+        finally:
+            os.remove(path)
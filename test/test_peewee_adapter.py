@@ -2,10 +2,13 @@
 
 from unittest import TestCase
 import peewee
-from pypfp.peewee_adapter import PeeweeRecord
+from pypfp.peewee_adapter import PeeweeRecord, load_into_db, export_to_file
 from pypfp.core import Field, FixedEngine
-from pypfp.converters import Float, Int, String
+from pypfp.converters import Float, Int, String, Decimal, DateTime
+import decimal
 import datetime
+import os
+import io
 
 
 class BaseRecord(PeeweeRecord):
@@ -39,6 +42,38 @@ class RecordB(BaseRecord):
         fill = u'?'
 
 
+class Header(PeeweeRecord):
+    typ = Field(Int, 2)
+    name = Field(String, 10)
+    age = Field(Int, 2)
+    salary = Field(Float, 14, precision=4)
+
+    class Meta:
+        database = BaseRecord._meta.database
+        selector_string = u'01'
+
+
+class Address(PeeweeRecord):
+    typ = Field(Int, 2)
+    address = Field(String, 10, truncate=True)
+    phone = Field(String, 20)
+
+    class Meta:
+        database = BaseRecord._meta.database
+        selector_string = u'02'
+
+
+class Payment(PeeweeRecord):
+    amount = Field(Decimal, 10, precision=2, decimal_separator='')
+    day = Field(DateTime, 8, str_format='%Y%m%d')
+    source = peewee.CharField(default='file')
+    loaded = peewee.IntegerField(default=lambda: 7)
+    note = peewee.CharField(null=True)
+
+    class Meta:
+        database = BaseRecord._meta.database
+
+
 class TestPeeweeAdapter(TestCase):
 
     def test_record_generation(self):
@@ -100,4 +135,81 @@ class TestPeeweeAdapter(TestCase):
         self.assertEquals(c2.age, c1.age)
 
 
-
+class TestLoadIntoDb(TestCase):
+
+    def setUp(self):
+        for model in (Header, Address):
+            model.drop_table(fail_silently=True)
+            model.create_table()
+        self.engine = FixedEngine([Header, Address], selector_slice=(0, 2))
+        self.path = 'samples/test_db_sample.txt'
+        objs = self.engine.load('samples/sample_utf8.txt') * 100
+        self.engine.save(self.path, objs)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_counts(self):
+        counts = load_into_db(self.engine, self.path, batch_size=7)
+        self.assertEqual(counts, {'header': 200, 'address': 400})
+        self.assertEqual(Header.select().count(), 200)
+        self.assertEqual(Address.select().count(), 400)
+
+    def test_values(self):
+        load_into_db(self.engine, 'samples/sample_utf8.txt')
+        rows = list(Header.select().order_by(Header.id))
+        self.assertEqual([r.name for r in rows], [u'ariel', u'lorena'])
+        self.assertEqual(rows[1].salary, 678.99)
+        addresses = [a.address for a in Address.select().order_by(Address.id)]
+        self.assertEqual(addresses[2], u'\xe1\xd1\xa1\xbf\xfc')
+
+    def test_conversions_and_defaults(self):
+        Payment.drop_table(fail_silently=True)
+        Payment.create_table()
+        data = io.BytesIO('000001234520121113\n000000-05020130101')
+        counts = load_into_db(FixedEngine([Payment]), data)
+        self.assertEqual(counts, {'payment': 2})
+        p1, p2 = Payment.select().order_by(Payment.id)
+        self.assertEqual(p1.amount, decimal.Decimal('123.45'))
+        self.assertEqual(p2.amount, decimal.Decimal('-0.5'))
+        self.assertEqual(p1.day, datetime.date(2012, 11, 13))
+        self.assertEqual((p1.source, p1.loaded, p1.note), (u'file', 7, None))
+
+
+class TestExportToFile(TestCase):
+
+    def setUp(self):
+        for model in (Header, Address, Payment):
+            model.drop_table(fail_silently=True)
+            model.create_table()
+        self.engine = FixedEngine([Header, Address], selector_slice=(0, 2))
+        load_into_db(self.engine, 'samples/sample_utf8.txt')
+        self.sample = open('samples/sample_utf8.txt', 'rb').read()
+
+    def test_interleaved(self):
+        def sources():
+            for header_id, address_ids in ((1, (1, 2)), (2, (3, 4))):
+                yield Header, Header.select().where(Header.id == header_id)
+                yield Address, Address.select().where(
+                    Address.id << address_ids).order_by(Address.id)
+
+        out = io.BytesIO()
+        counts = export_to_file(self.engine, out, sources(), buffer_size=10)
+        self.assertEqual(out.getvalue(), self.sample)
+        self.assertEqual(counts, {'header': 2, 'address': 4})
+
+    def test_whole_tables(self):
+        out = io.BytesIO()
+        export_to_file(self.engine, out, [Header, Address])
+        lines = self.sample.split('\n')
+        self.assertEqual(out.getvalue().split('\n'),
+                         [lines[0], lines[3], lines[1], lines[2], lines[4],
+                          lines[5]])
+
+    def test_converted_values(self):
+        data = '000001234520121113\n000000-05020130101'
+        engine = FixedEngine([Payment])
+        load_into_db(engine, io.BytesIO(data))
+        self.assertEqual(list(Payment.iter_strings(
+                              Payment.select().order_by(Payment.id))),
+                         data.split('\n'))
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 *-*
+
+import unittest
+import os
+from pypfp.core import FixedEngine
+from test.test_core import RecordA, RecordB
+
+
+class TestMappedReader(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = FixedEngine([RecordA, RecordB], selector_slice=(0, 2))
+        self.objs = self.engine.load('samples/sample_utf8.txt')
+        self.index = 'samples/test_sample.idx'
+
+    def tearDown(self):
+        for path in (self.index, 'samples/test_fixed.txt'):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def test_variable_length_lines(self):
+        with self.engine.mapped('samples/sample_utf8.txt') as r:
+            self.assertIsNone(r.line_length)
+            self.assertEqual(len(r), len(self.objs))
+            self.assertEqual(r[0], self.objs[0])
+            self.assertEqual(r[4], self.objs[4])
+            self.assertEqual(r[-1], self.objs[-1])
+            self.assertEqual(r[1:5:2], self.objs[1:5:2])
+            self.assertEqual(list(r), self.objs)
+            self.assertRaises(IndexError, lambda: r[len(self.objs)])
+
+    def test_sidecar_index(self):
+        r = self.engine.mapped('samples/sample_utf8.txt',
+                               index_path=self.index)
+        offsets = r._offsets
+        r.close()
+        self.assertTrue(os.path.exists(self.index))
+        r = self.engine.mapped('samples/sample_utf8.txt',
+                               index_path=self.index)
+        self.assertEqual(r._offsets, offsets)
+        self.assertEqual(r[3], self.objs[3])
+        r.close()
+
+    def test_stale_sidecar_index(self):
+        with open(self.index, 'wb') as f:
+            f.write('pypfp-index 1 1.0 2 8\n')
+        with self.engine.mapped('samples/sample_utf8.txt',
+                                index_path=self.index) as r:
+            self.assertEqual(r[5], self.objs[5])
+
+    def test_truncated_sidecar_index(self):
+        self.engine.mapped('samples/sample_utf8.txt',
+                           index_path=self.index).close()
+        self.assertFalse(os.path.exists(self.index + '.tmp'))
+        data = open(self.index, 'rb').read()
+        with open(self.index, 'wb') as f:
+            f.write(data[:-3])
+        with self.engine.mapped('samples/sample_utf8.txt',
+                                index_path=self.index) as r:
+            self.assertEqual(r[5], self.objs[5])
+        self.assertEqual(open(self.index, 'rb').read(), data)
+
+    def test_constant_length_lines(self):
+        engine = FixedEngine([RecordA])
+        objs = [RecordA(typ=1, name=u'n%d' % i, age=i, salary=i * 1.5)
+                for i in range(50)]
+        engine.save('samples/test_fixed.txt', objs)
+        with engine.mapped('samples/test_fixed.txt') as r:
+            self.assertEqual(r.line_length, 29)
+            self.assertEqual(len(r), 50)
+            self.assertEqual(r[49], objs[49])
+            self.assertEqual(r[10:13], objs[10:13])
+
+    def test_one_short_line(self):
+        engine = FixedEngine([RecordA])
+        objs = [RecordA(typ=1, name=u'n%d' % i, age=i % 100, salary=i * 1.5)
+                for i in range(1000)]
+        engine.save('samples/test_fixed.txt', objs)
+        lines = open('samples/test_fixed.txt', 'rb').read().split('\n')
+        # same size, but lines 500 and 501 aren't at their offsets
+        lines[500] = lines[500][:-3]
+        lines[501] += 'abc'
+        with open('samples/test_fixed.txt', 'wb') as f:
+            f.write('\n'.join(lines))
+        with engine.mapped('samples/test_fixed.txt') as r:
+            self.assertIsNone(r.line_length)
+            self.assertEqual(r.line(501), lines[501].decode('utf-8') + u'\n')
+        # new lines at every offset and one more
+        lines = ['01' + 'x' * 26] * 10
+        lines[5] = '01xx\nxx' + 'x' * 21
+        with open('samples/test_fixed.txt', 'wb') as f:
+            f.write('\n'.join(lines))
+        with engine.mapped('samples/test_fixed.txt') as r:
+            self.assertIsNone(r.line_length)
+
+    def test_unmatched_line(self):
+        engine = FixedEngine([RecordA], selector_slice=(0, 2))
+        with engine.mapped('samples/sample_utf8.txt') as r:
+            self.assertEqual(r[0], self.objs[0])
+            self.assertIsNone(r[1])
+
+
+class TestResumableReader(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = FixedEngine([RecordA, RecordB], selector_slice=(0, 2))
+        self.objs = self.engine.load('samples/sample_utf8.txt')
+        self.lines = open('samples/sample_utf8.txt', 'rb').read().splitlines()
+        self.path = 'samples/test_feed.txt'
+        self.checkpoint = 'samples/test_feed.ckpt'
+
+    def tearDown(self):
+        for path in (self.path, self.checkpoint):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def write(self, data, mode='ab'):
+        with open(self.path, mode) as f:
+            f.write(data)
+
+    def load(self, **kwargs):
+        with self.engine.resumable(self.path, self.checkpoint) as r:
+            return list(r.iter_load(commit_every=2, **kwargs))
+
+    def test_only_new_lines(self):
+        data = '\n'.join(self.lines) + '\n'
+        # the fourth line is still being written
+        cut = len('\n'.join(self.lines[:3])) + 5
+        self.write(data[:cut], 'wb')
+        self.assertEqual(self.load(), self.objs[:3])
+        self.assertEqual(self.load(), [])
+        self.write(data[cut:])
+        self.assertEqual(self.load(), self.objs[3:])
+        self.assertEqual(self.load(), [])
+
+    def test_final_line_without_new_line(self):
+        self.write('\n'.join(self.lines), 'wb')
+        self.assertEqual(self.load(), self.objs[:-1])
+        self.assertEqual(self.load(final=True), self.objs[-1:])
+
+    def test_resume_after_crash(self):
+        self.write('\n'.join(self.lines) + '\n', 'wb')
+        r = self.engine.resumable(self.path, self.checkpoint)
+        it = r.iter_load(commit_every=2)
+        self.assertEqual([next(it) for _ in range(5)], self.objs[:5])
+        r.close()
+        # lines 1 to 4 were committed, the fifth one is parsed again
+        self.assertEqual(self.load(), self.objs[4:])
+
+    def test_manual_commit(self):
+        self.write('\n'.join(self.lines) + '\n', 'wb')
+        with self.engine.resumable(self.path, self.checkpoint) as r:
+            it = iter(r)
+            next(it), next(it)
+            next(it)
+            r.commit()
+            self.assertEqual(r.line_number, 2)
+        with self.engine.resumable(self.path, self.checkpoint) as r:
+            self.assertEqual(r.line_number, 2)
+            self.assertEqual(list(r), self.objs[2:])
+
+    def test_replaced_file(self):
+        self.write('\n'.join(self.lines) + '\n', 'wb')
+        self.assertEqual(self.load(), self.objs)
+        os.remove(self.path)
+        self.write('\n'.join(self.lines[:2]) + '\n', 'wb')
+        self.assertEqual(self.load(), self.objs[:2])
+        self.write('\n'.join(self.lines[:1]) + '\n', 'wb')
+        self.assertEqual(self.load(), self.objs[:1])
+
+    def test_rejects_and_bytes_mode(self):
+        self.write('\n'.join(self.lines[:2]) + '\n', 'wb')
+        self.load()
+        self.write('01ariel     XX000000123.4500\n' +
+                   '\n'.join(self.lines[2:]) + '\n')
+        with self.engine.resumable(self.path, self.checkpoint, 'latin-1',
+                                   bytes_mode=True) as r:
+            objs = list(r.iter_load(on_error='collect'))
+        self.assertEqual([x.line_number for x in r.rejects.rejected], [3])
+        self.assertIsNone(self.engine.rejects)
+        self.assertEqual(objs, self.engine.load(self.path, 'latin-1',
+                                                on_error='skip')[2:])
+
+    def test_multi_byte_new_lines(self):
+        self.write('', 'wb')
+        self.assertRaises(ValueError, self.engine.resumable, self.path,
+                          self.checkpoint, 'utf-16')
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 *-*
+import io
+import os
+import unittest
+
+from pypfp.core import FixedEngine
+from pypfp.parallel import iter_parallel
+from pypfp.rejects import Rejects, Rejected
+from test.test_core import RecordA, RecordB
+
+
+class TestRejects(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = FixedEngine([RecordA, RecordB], selector_slice=(0, 2))
+        self.objs = self.engine.load('samples/sample_utf8.txt')
+        lines = open('samples/sample_utf8.txt', 'rb').read().splitlines()
+        # a bad age in line 2 and a bad salary in line 5
+        lines.insert(1, '01ariel     XX000000123.4500')
+        lines.insert(4, '01ariel     3200000012x.4500')
+        self.path = 'samples/test_rejects.txt'
+        with open(self.path, 'wb') as f:
+            f.write('\n'.join(lines * 20))
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_raise_by_default(self):
+        self.assertRaises(ValueError, self.engine.load, self.path)
+        self.assertIsNone(self.engine.rejects)
+
+    def test_skip(self):
+        objs = self.engine.load(self.path, on_error='skip')
+        self.assertEqual(objs, self.objs * 20)
+        self.assertEqual(self.engine.rejects.count, 40)
+        self.assertEqual(self.engine.rejects.rejected, [])
+
+    def test_collect(self):
+        self.engine.load(self.path, on_error='collect')
+        rejected = self.engine.rejects.rejected
+        self.assertEqual(len(rejected), 40)
+        self.assertEqual(rejected[0][:3], (2, 'RecordA', 'age'))
+        self.assertEqual(rejected[1][:3], (5, 'RecordA', 'salary'))
+        self.assertEqual(rejected[2][:3], (10, 'RecordA', 'age'))
+        self.assertTrue(rejected[0].reason.startswith(u'ValueError: '))
+        self.assertEqual(rejected[0].line, u'01ariel     XX000000123.4500\n')
+
+    def test_reject_stream(self):
+        out = io.BytesIO()
+        self.engine.load(self.path, on_error='skip', rejects=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 40)
+        number, record, field, reason, line = lines[1].split('\t')
+        self.assertEqual((number, record, field, line),
+                         ('5', 'RecordA', 'salary',
+                          '01ariel     3200000012x.4500'))
+
+    def test_reject_file_bytes_mode(self):
+        fi = 'samples/test_rejected.txt'
+        self.engine.load(self.path, 'latin-1', bytes_mode=True,
+                         on_error='skip', rejects=fi)
+        with io.open(fi, encoding='latin-1') as f:
+            lines = f.read().splitlines()
+        os.remove(fi)
+        self.assertEqual(len(lines), 40)
+        self.assertTrue(lines[0].startswith(u'2\tRecordA\tage\tValueError'))
+
+    def test_max_errors(self):
+        self.assertRaises(ValueError, self.engine.load, self.path,
+                          on_error='skip', max_errors=39)
+        self.assertEqual(len(self.engine.load(self.path, on_error='skip',
+                                              max_errors=40)),
+                         len(self.objs) * 20)
+
+    def test_parallel(self):
+        for ordered in (True, False):
+            out = io.BytesIO()
+            rejects = Rejects('collect', out)
+            objs = list(iter_parallel(self.engine, self.path, workers=3,
+                                      ordered=ordered, chunk_size=100,
+                                      rejects=rejects))
+            if ordered:
+                self.assertEqual(objs, self.objs * 20)
+            self.assertEqual([r.line_number for r in rejects.rejected],
+                             [n + 8 * i for i in range(20) for n in (2, 5)])
+            self.assertEqual(len(out.getvalue().splitlines()), 40)
+        self.assertEqual(len(self.engine.load(self.path, workers=2,
+                                              on_error='skip')),
+                         len(self.objs) * 20)
+        self.assertRaises(ValueError, self.engine.load, self.path, workers=2,
+                          on_error='skip', max_errors=3)
+
+    def test_own_rejects(self):
+        rejects = Rejects('collect')
+        objs = self.engine.iter_load(self.path, rejects=rejects)
+        self.assertEqual(next(objs), self.objs[0])
+        self.engine.load('samples/sample_utf8.txt')
+        self.engine.push_parser(on_error='skip').close()
+        self.assertIsNone(self.engine.rejects)
+        self.assertEqual(len(list(objs)), len(self.objs) * 20 - 1)
+        self.assertEqual(rejects.count, 40)
+        self.assertEqual(len(rejects.rejected), 40)
+
+    def test_reject_file_opened_lazily(self):
+        fi = 'samples/test_rejected.txt'
+        objs = self.engine.iter_load(self.path, on_error='skip', rejects=fi)
+        self.assertFalse(os.path.exists(fi))
+        objs.close()
+        self.assertFalse(os.path.exists(fi))
+        self.engine.load('samples/sample_utf8.txt', on_error='skip',
+                         rejects=fi)
+        self.assertEqual(open(fi, 'rb').read(), '')
+        os.remove(fi)
+
+    def test_unknown_policy(self):
+        self.assertRaises(AssertionError, self.engine.load, self.path,
+                          on_error='ignore')
+
+    def test_text_stream(self):
+        out = io.StringIO()
+        rejects = Rejects('collect', out)
+        rejects.add(Rejected(3, 'RecordB', None, u'ValueError: x',
+                             u'02\xe1\r\n'))
+        self.assertEqual(out.getvalue(),
+                         u'3\tRecordB\t\tValueError: x\t02\xe1\n')
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 *-*
+import os
+import json
+import unittest
+
+from pypfp.core import FixedEngine
+from pypfp.stats import LoadStats
+from test.test_core import RecordA, RecordB
+
+
+class TestLoadStats(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = FixedEngine([RecordA, RecordB], selector_slice=(0, 2))
+        self.path = 'samples/sample_utf8.txt'
+        self.objs = self.engine.load(self.path)
+
+    def test_disabled_by_default(self):
+        self.assertIsNone(self.engine.stats)
+
+    def test_counts(self):
+        stats = self.engine.enable_stats()
+        self.assertEqual(self.engine.load(self.path), self.objs)
+        self.assertEqual(stats.lines, {'RecordA': 2, 'RecordB': 4})
+        self.assertEqual(stats.unmatched, 0)
+        self.assertEqual(stats.bytes_read, os.path.getsize(self.path))
+        self.assertEqual(set(stats.field_time),
+                         set([('RecordA', f.name)
+                              for f in RecordA._record_options.fields] +
+                             [('RecordB', f.name)
+                              for f in RecordB._record_options.fields]))
+        self.assertTrue(all(t >= 0 for t in stats.field_time.values()))
+
+    def test_unmatched_and_errors(self):
+        stats = self.engine.enable_stats()
+        lines = [u'03xx', u'01ariel     XX000000123.4500']
+        self.assertRaises(ValueError, list, self.engine.parse_lines(lines))
+        self.assertEqual(stats.unmatched, 1)
+        self.assertEqual(stats.field_errors, {('RecordA', 'age'): 1})
+
+    def test_bytes_mode(self):
+        stats = self.engine.enable_stats()
+        self.assertEqual(self.engine.load(self.path, 'latin-1',
+                                          bytes_mode=True),
+                         self.engine.load(self.path, 'latin-1'))
+        self.assertEqual(stats.lines, {'RecordA': 4, 'RecordB': 8})
+
+    def test_parallel(self):
+        stats = self.engine.enable_stats()
+        self.assertEqual(self.engine.load(self.path, workers=2), self.objs)
+        self.assertEqual(stats.lines, {'RecordA': 2, 'RecordB': 4})
+        self.assertEqual(stats.bytes_read, os.path.getsize(self.path))
+        self.assertEqual(len(stats.field_time), 7)
+
+    def test_query_and_lazy(self):
+        stats = self.engine.enable_stats()
+        self.engine.load(self.path, where={'age': 30})
+        self.assertEqual(stats.lines, {'RecordA': 2, 'RecordB': 4})
+        self.assertEqual(stats.filtered, 5)
+        self.assertEqual(stats.field_time, {})
+        self.engine.lazy = True
+        self.engine.load(self.path)
+        self.assertEqual(stats.lines, {'RecordA': 4, 'RecordB': 8})
+
+    def test_merge_and_export(self):
+        stats = self.engine.enable_stats()
+        self.engine.load(self.path)
+        total = LoadStats()
+        total.merge(stats)
+        total.merge(stats)
+        summary = json.loads(json.dumps(total.as_dict()))
+        self.assertEqual(summary['bytes_read'], 2 * stats.bytes_read)
+        self.assertEqual(summary['records']['RecordA']['lines'], 4)
+        self.assertEqual(summary['records']['RecordB']['fields']['phone'],
+                         {'seconds': 2 * stats.field_time['RecordB', 'phone'],
+                          'errors': 0})
+        report = total.report().splitlines()
+        self.assertEqual(len(report), 9)
+        self.assertTrue(report[-1].startswith('bytes read'))
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 *-*
+import io
+import os
+import bz2
+import gzip
+import unittest
+
+from pypfp.core import FixedEngine
+from pypfp.readers import MappedReader
+from pypfp.streams import lzma, detect, threaded, read_chunks, open_output
+from test.test_core import RecordA, RecordB
+
+
+class TestCompressedFiles(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = FixedEngine([RecordA, RecordB], selector_slice=(0, 2))
+        self.path = 'samples/sample_utf8.txt'
+        self.objs = self.engine.load(self.path)
+        self.data = open(self.path, 'rb').read()
+        self.files = []
+
+    def tearDown(self):
+        for fi in self.files:
+            if os.path.exists(fi):
+                os.remove(fi)
+
+    def save(self, fi, objs=None, **kwargs):
+        self.files.append(fi)
+        self.engine.save(fi, objs or self.objs, **kwargs)
+        return fi
+
+    def test_round_trip(self):
+        extensions = ['.gz', '.bz2'] + (['.xz'] if lzma else [])
+        names = ['gzip', 'bz2', 'xz']
+        for extension, name in zip(extensions, names):
+            fi = self.save('samples/test_streams.txt' + extension)
+            self.assertEqual(detect(open(fi, 'rb').read(10)), name)
+            self.assertEqual(self.engine.load(fi), self.objs)
+            self.assertEqual(self.engine.load(fi, 'latin-1', bytes_mode=True),
+                             self.engine.load(self.path, 'latin-1'))
+
+    def test_detect_by_magic(self):
+        fi = self.save('samples/test_streams.txt', compression='gzip')
+        self.assertEqual(gzip.open(fi).read(), self.data)
+        self.assertEqual(self.engine.load(fi), self.objs)
+        self.assertRaises(ValueError, self.engine.load, fi, compression=None)
+
+    def test_plain_text_like_magic(self):
+        self.assertEqual(detect('BZh9'), None)
+        self.assertEqual(detect('\x1f\x8b\x08'), 'gzip')
+        self.assertEqual(detect(bz2.compress('')), 'bz2')
+        fi = 'samples/test_streams.txt'
+        self.files.append(fi)
+        with open(fi, 'wb') as f:
+            f.write('BZhang    \n')
+        self.assertEqual(list(read_chunks(fi)), ['BZhang    \n'])
+
+    def test_several_members(self):
+        fi = self.save('samples/test_streams.txt.bz2')
+        with open(fi, 'ab') as f:
+            f.write(open(fi, 'rb').read())
+        self.assertEqual(''.join(read_chunks(fi)), self.data * 2)
+        out = io.BytesIO()
+        for _ in range(3):
+            f = open_output(out, 'gzip')
+            f.write(self.data)
+            f.close()
+        self.assertEqual(''.join(read_chunks(io.BytesIO(out.getvalue()))),
+                         self.data * 3)
+
+    def test_stream(self):
+        out = io.BytesIO()
+        self.engine.save(out, self.objs, compression='gzip')
+        self.assertFalse(out.closed)
+        self.assertEqual(self.engine.load(io.BytesIO(out.getvalue())),
+                         self.objs)
+
+    def test_compressed_stream_read_in_chunks(self):
+        class Reads(io.BytesIO):
+            sizes = []
+
+            def read1(self, size=-1):
+                data = io.BytesIO.read1(self, size)
+                self.sizes.append(len(data))
+                return data
+
+            def read(self, size=-1):
+                data = io.BytesIO.read(self, size)
+                self.sizes.append(len(data))
+                return data
+        plain, out = io.BytesIO(), io.BytesIO()
+        self.engine.save(plain, self.objs * 1000)
+        self.engine.save(out, self.objs * 1000, compression='gzip')
+        data = out.getvalue()
+        f = Reads(data)
+        self.assertTrue(''.join(read_chunks(f, 1000)) == plain.getvalue())
+        self.assertEqual(sum(f.sizes), len(data))
+        self.assertTrue(len(f.sizes) <= len(data) // 1000 + 3)
+        self.assertTrue(max(f.sizes) <= 1000)
+
+    def test_threaded(self):
+        fi = self.save('samples/test_streams.txt.gz', self.objs * 1000,
+                       threaded_io=True)
+        self.assertEqual(self.engine.load(fi, threaded_io=True),
+                         self.objs * 1000)
+        objs = self.engine.iter_load(fi, threaded_io=True)
+        self.assertEqual(next(objs), self.objs[0])
+        objs.close()
+
+    def test_parallel(self):
+        fi = self.save('samples/test_streams.txt.gz', self.objs * 100)
+        self.assertEqual(self.engine.load(fi, workers=2), self.objs * 100)
+
+    def test_mapped(self):
+        fi = self.save('samples/test_streams.txt.gz')
+        self.assertRaises(ValueError, MappedReader, self.engine, fi)
+
+    def test_unknown(self):
+        self.assertRaises(ValueError, self.engine.save, 'samples/x.txt',
+                          self.objs, compression='zip')
+        self.assertFalse(os.path.exists('samples/x.txt'))
+
+
+class TestThreaded(unittest.TestCase):
+
+    def test_items_and_errors(self):
+        self.assertEqual(list(threaded(iter(range(100)), 2)), range(100))
+
+        def failing():
+            yield 1
+            raise ValueError('bad')
+        items = threaded(failing())
+        self.assertEqual(next(items), 1)
+        self.assertRaises(ValueError, next, items)
+
+    def test_writer_errors(self):
+        class Broken(object):
+            def write(self, data):
+                raise IOError('full')
+
+            def close(self):
+                pass
+        f = open_output(Broken(), None, threaded_io=True)
+        f.write('x')
+        self.assertRaises(IOError, f.close)